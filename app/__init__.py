@@ -6,7 +6,6 @@ from flask_jwt_extended import JWTManager
 from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from datetime import timedelta
 
 # Cargar las variables de entorno
@@ -15,8 +14,11 @@ load_dotenv()
 # Configuración de Redis para Flask-Limiter
 redis_host = os.getenv("REDIS_STORAGE_URI", "memory://")
 
-# Configuración inicial de Flask-Limiter
-limiter = Limiter(key_func=get_remote_address, storage_uri=redis_host, strategy="moving-window")
+# Registra la estrategia "two-tier" (presupuesto local por llave delante de Redis)
+from .ratelimit import rate_limit_key
+
+# Configuración inicial de Flask-Limiter (llave por identidad del JWT o IP)
+limiter = Limiter(key_func=rate_limit_key, storage_uri=redis_host, strategy=os.getenv("RATELIMIT_STRATEGY", "moving-window"))
 
 # Configuración de MongoDB
 mongo = PyMongo()
@@ -38,6 +40,23 @@ def create_app():
     app.config["MONGO_URI"] = os.getenv("MONGO_URI")
     mongo.init_app(app)
 
+    # Si MongoDB no responde pronto se omiten los pasos de inicio que lo usan (no se espera el timeout completo);
+    # los indices y el contador de SKUs se preparan antes de la primera escritura que los necesita,
+    # y el indice de busqueda y el bootstrap se construyen en el primer uso
+    from .database import mongo_available
+    from .crud import prepare_database
+    mongo_ready = mongo_available(mongo)
+    if not mongo_ready:
+        app.logger.error("MongoDB is not reachable at startup, deferring index creation and cache warm-up")
+    else:
+        # Duplicados previos, indices declarados en app/database.py y contador de SKUs
+        # (falla si no se puede crear un indice unico requerido)
+        changes, failures = prepare_database(mongo) or ([], [])
+        for change in changes:
+            app.logger.warning(f"Reassigned duplicated unique value {change}")
+        for failure in failures:
+            app.logger.warning(f"Could not create MongoDB index {failure}")
+
     # Configuración de JWT
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
     app.config["JWT_COOKIE_SECURE"] = os.getenv("FLASK_ENV") == "production"  # True si está en producción
@@ -48,15 +67,62 @@ def create_app():
 
     jwt = JWTManager(app)
 
+    # Tokens revocados (logout); el filtro de Bloom evita consultar el backend en la mayoria de los casos
+    from .denylist import token_denylist
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return token_denylist.is_revoked(jwt_payload["jti"])
+
+    # Paginacion del listado de productos
+    app.config["PRODUCTS_PAGE_SIZE"] = int(os.getenv("PRODUCTS_PAGE_SIZE", 24))
+    app.config["PRODUCTS_MAX_PAGE_SIZE"] = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", 100))
+    app.config["PRODUCTS_IMPORT_MAX_SIZE"] = int(os.getenv("PRODUCTS_IMPORT_MAX_SIZE", 1000))
+
+    # Paginacion del listado de users (admin)
+    app.config["USERS_PAGE_SIZE"] = int(os.getenv("USERS_PAGE_SIZE", 50))
+    app.config["USERS_MAX_PAGE_SIZE"] = int(os.getenv("USERS_MAX_PAGE_SIZE", 200))
+
+    # Paginacion del historial de pedidos
+    app.config["ORDERS_PAGE_SIZE"] = int(os.getenv("ORDERS_PAGE_SIZE", 20))
+    app.config["ORDERS_MAX_PAGE_SIZE"] = int(os.getenv("ORDERS_MAX_PAGE_SIZE", 100))
+
+    # Documentos por lote del cursor en la exportacion de pedidos
+    app.config["ORDERS_EXPORT_BATCH_SIZE"] = int(os.getenv("ORDERS_EXPORT_BATCH_SIZE", 1000))
+
+    # Maximo de pedidos por actualizacion masiva de status
+    app.config["ORDERS_BULK_MAX_SIZE"] = int(os.getenv("ORDERS_BULK_MAX_SIZE", 1000))
+
+    # Compresion gzip/brotli de respuestas JSON
+    from middlewares.compression import init_compression
+    init_compression(app)
+
     # Manejo del error 429 (Too Many Requests)
     @app.errorhandler(429)
     def ratelimit_error(error):
         return jsonify({"code": "429", "message": "Too many requests, please try again later."}), 429
 
     # Registrar Blueprints
-    from .routes import main
+    from .routes import main, encode_bootstrap
     app.register_blueprint(main)
 
+    if mongo_ready:
+        # Construir el indice de busqueda de productos
+        from .crud import iter_products_from_mongo
+        from .search import product_search_index
+        try:
+            product_search_index.build(iter_products_from_mongo(mongo))
+        except Exception as e:
+            app.logger.warning(f"Could not build product search index: {str(e)}")
+
+        # Precalcular el snapshot del bootstrap antes de recibir trafico
+        from .cache import bootstrap_snapshot
+        with app.app_context():
+            try:
+                bootstrap_snapshot.get(encode_bootstrap)
+            except Exception as e:
+                app.logger.warning(f"Could not build bootstrap snapshot: {str(e)}")
+
     return app
 
 # Asegurar que usa el puerto dinámico en Render
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from werkzeug.security import generate_password_hash, check_password_hash
+
+## CLAIMS DE ROL EN JWT ##
+
+# Si esta activo, login/refresh agregan rol y version del user al token y el middleware autoriza sin MongoDB
+JWT_ROLE_CLAIMS = os.getenv("JWT_ROLE_CLAIMS", "false").lower() == "true"
+
+# Version asignada a users borrados: invalida cualquier token emitido
+REVOKED_VERSION = float("inf")
+
+
+class TokenVersionMap:
+    """Version minima valida de token por user (solo users revocados en este proceso).
+
+    Cada worker mantiene su propio mapa; en otros workers los tokens revocados
+    siguen validos como maximo hasta que expira el access token.
+    """
+
+    def __init__(self):
+        self._min_versions = {}
+        self._lock = Lock()
+
+    def revoke(self, user_id: str, min_version=REVOKED_VERSION):
+        with self._lock:
+            self._min_versions[user_id] = max(self._min_versions.get(user_id, 0), min_version)
+
+    def is_valid(self, user_id: str, version):
+        return (version or 0) >= self._min_versions.get(user_id, 0)
+
+    def __len__(self):
+        return len(self._min_versions)
+
+
+user_token_versions = TokenVersionMap()
+
+# Claims adicionales del token a partir del documento del user
+def build_user_claims(user: dict):
+    if not JWT_ROLE_CLAIMS:
+        return {}
+    return {"role": user.get("role"), "ver": user.get("tokenVersion", 0)}
+
+
+## HASH DE CLAVES ##
+
+# Metodo de werkzeug con el costo explicito, p.ej. "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:260000")
+
+
+class HashingPoolSaturated(Exception):
+    """No quedan cupos en el pool de hashing (se responde 503)."""
+
+
+class PasswordHasher:
+    """Ejecuta el hash/verificacion de claves en un pool acotado de threads.
+
+    Como maximo `workers` hashes corren a la vez y `queue_limit` esperan en
+    cola; por sobre eso se rechaza de inmediato en vez de bloquear al worker.
+    """
+
+    def __init__(self, method: str, workers: int, queue_limit: int, timeout: float):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = BoundedSemaphore(workers + queue_limit)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated("password hashing pool is saturated")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password: str):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, hashed: str, password: str):
+        return self._run(check_password_hash, hashed, password)
+
+    # True si el hash fue generado con otro metodo o costo que el configurado
+    def needs_rehash(self, hashed: str):
+        return hashed.split("$", 1)[0] != self.method
+
+
+password_hasher = PasswordHasher(
+    method=PASSWORD_HASH_METHOD,
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    queue_limit=int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 8)),
+    timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+)
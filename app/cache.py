@@ -0,0 +1,163 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+## CACHE EN MEMORIA ##
+
+class TTLCache:
+    """Cache LRU acotado por tamaño con expiración por TTL (en segundos).
+
+    `version` se incrementa en cada invalidacion (es local al proceso).
+
+    Con `aligned` las entradas vencen al final de la ventana de reloj
+    `generation()` (time.time() // ttl), la misma en todos los workers: dentro
+    de una generacion cada proceso carga los datos una sola vez, y las
+    escrituras hechas en otros workers (o directo en MongoDB) se ven en la
+    siguiente generacion.
+    """
+
+    def __init__(self, ttl: int, maxsize: int, aligned: bool = False):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.aligned = aligned
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            # Descarta lecturas que comenzaron antes de una invalidacion
+            if version is not None and version != self.version:
+                return
+            ttl = self.ttl - time.time() % self.ttl if self.aligned else self.ttl
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.version += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "version": self.version
+            }
+
+    # Ventana de reloj actual (compartida entre workers)
+    def generation(self):
+        return int(time.time() // self.ttl)
+
+
+# ETag derivado del cuerpo: el mismo payload tiene el mismo tag en todos los workers y reinicios
+def body_etag(name: str, body: bytes):
+    return f"{name}-{hashlib.sha1(body).hexdigest()[:16]}"
+
+
+class VersionedSnapshot:
+    """Valor precalculado (p.ej. bytes ya codificados) asociado a la version de un cache.
+
+    Se reconstruye cuando la version del cache cambia (una escritura de este
+    proceso) o cuando empieza una nueva generacion del cache, asi que los
+    cambios hechos en otros workers se ven como maximo un TTL despues.
+    """
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self._version = None
+        self._value = None
+        self._lock = Lock()
+        self.builds = 0
+
+    def get(self, builder):
+        version = (self.cache.version, self.cache.generation())
+        if self._version == version:
+            return self._value
+        with self._lock:
+            if self._version != version:
+                # Si hay una invalidacion durante el build queda con la version anterior
+                self._value = builder()
+                self._version = version
+                self.builds += 1
+            return self._value
+
+
+# Cache del catalogo publico (productos, banner y categorias)
+catalog_cache = TTLCache(
+    ttl=int(os.getenv("CATALOG_CACHE_TTL", 300)),
+    maxsize=int(os.getenv("CATALOG_CACHE_MAXSIZE", 256)),
+    aligned=True
+)
+
+# Cuerpos de respuesta del catalogo por ETag: {"identity": bytes, "gzip": bytes, "br": bytes}
+# (el ETag de cada ruta se guarda en catalog_cache, que se invalida con las escrituras)
+catalog_bodies = TTLCache(
+    ttl=int(os.getenv("CATALOG_CACHE_TTL", 300)),
+    maxsize=int(os.getenv("CATALOG_BODY_CACHE_MAXSIZE", 128)),
+    aligned=True
+)
+
+# Cache de usuarios por identity; "request" (por defecto) o "process" para compartirla entre requests
+USER_CACHE_SCOPE = os.getenv("USER_CACHE_SCOPE", "request")
+user_cache = TTLCache(
+    ttl=int(os.getenv("USER_CACHE_TTL", 5)),
+    maxsize=int(os.getenv("USER_CACHE_MAXSIZE", 1024))
+)
+
+# Snapshot del bootstrap del storefront (productos + banner + categorias)
+bootstrap_snapshot = VersionedSnapshot(catalog_cache)
+
+def _make_key(name, args, kwargs):
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        return value
+    return (name, freeze(args), freeze(kwargs))
+
+# Decorador para lectores de crud con firma (mongo, *args); mongo no forma parte de la llave
+def cached(cache: TTLCache, name: str):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_function(mongo, *args, **kwargs):
+            key = _make_key(name, args, kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            version = cache.version
+            value = fn(mongo, *args, **kwargs)
+            cache.set(key, value, version)
+            return value
+        return decorated_function
+    return wrapper
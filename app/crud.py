@@ -1,61 +1,154 @@
-from .services import (serialize_mongo_document, validate_product_data,
+from .services import (serialize_mongo_document, map_document, projection, encode_cursor, validate_product_data,
     validate_user_data, validate_update_order_status_data, validate_and_filter_update_user,
-    validate_checkout_data, validate_and_filter_update_product)
+    validate_checkout_data, validate_and_filter_update_product, cart_quantities, price_checkout)
 from flask_pymongo import PyMongo
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from handlers.mongo_error_handler import ErrorHandlerMongo
+from .cache import catalog_cache, cached, user_cache, USER_CACHE_SCOPE
+from .search import product_search_index
+from .sequences import sku_sequence
+from .auth import JWT_ROLE_CLAIMS, user_token_versions
+from .database import ensure_indexes, duplicated_values, database_setup
+import re
 from datetime import datetime
+from flask import g, has_request_context
+
+## PROYECCIONES ##
+
+# Campos devueltos por cada lector; solo estos se piden a MongoDB
+PRODUCT_FIELDS = ("_id", "sku", "name", "category", "normalPrice", "rating", "dealPrice",
+    "discountPercentage", "imageResources", "subCategory", "description", "freeShiping",
+    "isActive", "uploadDateTime")
+BANNER_IMAGE_FIELDS = ("name", "imageResources")
+CATEGORY_FIELDS = ("_id", "name", "subcategories")
+USER_FIELDS = ("_id", "userName", "email", "address", "dateOfBirth", "role")
+ORDER_FIELDS = ("_id", "address", "deliveryDate", "email", "couponFactor", "couponAmount",
+    "paymentMethod", "cartProducts", "subTotalAmount", "shippingCost", "totalAmount",
+    "totalWithDiscountAmount", "trxDate", "user", "status", "lastStatusModificationDate")
+# Campos del pedido guardados tal como llegaron en el JSON del checkout (no requieren conversion)
+ORDER_RAW_FIELDS = ("cartProducts", "address")
+
+# Campos que se pueden modificar en las ediciones de admin
+USER_UPDATE_FIELDS = ("userName", "email", "address", "dateOfBirth", "role", "password")
+# El sku lo asigna el servidor al crear el producto y no se edita
+PRODUCT_UPDATE_FIELDS = ("name", "category", "subCategory", "normalPrice", "dealPrice",
+    "discountPercentage", "description", "freeShiping", "isActive")
+
+# Campos de orden y facetas permitidos en la navegacion de productos
+PRODUCT_SORT_FIELDS = ("dealPrice", "rating", "discountPercentage")
+PRODUCT_FACET_FIELDS = ("category", "subCategory", "freeShiping")
 
 ## CRUD APP ##
 
-# Obtener productos
-def get_products_from_mongo(mongo: PyMongo):
-    products = mongo.db.products.find({"isActive": "true"})
-    return [
-        {
-            "_id": str(product["_id"]),
-            "sku": product.get("sku"),
-            "name": product.get("name"),
-            "category": product.get("category"),
-            "normalPrice": product.get("normalPrice"),
-            "rating": product.get("rating"),
-            "dealPrice": product.get("dealPrice"),
-            "discountPercentage": product.get("discountPercentage"),
-            "imageResources": product.get("imageResources"),
-            "subCategory": product.get("subCategory"),
-            "description": product.get("description"),
-            "freeShiping": product.get("freeShiping"),
-            "isActive": product.get("isActive"),
-            "uploadDateTime": product.get("uploadDateTime")
-        }
-        for product in products
+# Mapear un producto a su representacion publica
+def map_product(product: dict):
+    return map_document(product, PRODUCT_FIELDS)
+
+# Iterar productos activos directamente desde el cursor
+def iter_products_from_mongo(mongo: PyMongo, filters: dict = None):
+    products = mongo.db.products.find({"isActive": "true", **(filters or {})}, projection(PRODUCT_FIELDS))
+    return (map_product(product) for product in products)
+
+# Obtener productos (filtros opcionales se resuelven en MongoDB)
+@cached(catalog_cache, "products")
+def get_products_from_mongo(mongo: PyMongo, filters: dict = None):
+    return list(iter_products_from_mongo(mongo, filters))
+
+# Obtener una pagina de productos (paginacion por cursor sobre _id)
+@cached(catalog_cache, "products_page")
+def get_products_page(mongo: PyMongo, limit: int, after: str = None):
+    query = {"isActive": "true"}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    # Se pide un documento extra para saber si existe una pagina siguiente
+    products = [
+        map_product(product)
+        for product in mongo.db.products.find(query, projection(PRODUCT_FIELDS)).sort("_id", ASCENDING).limit(limit + 1)
     ]
+    next_cursor = products[limit - 1]["_id"] if len(products) > limit else None
+    return products[:limit], next_cursor
+
+# Navegar productos con orden, rango de precio y facetas en una sola agregacion
+@cached(catalog_cache, "products_browse")
+def browse_products(mongo: PyMongo, sort: str = None, descending: bool = False, min_price: float = None,
+                    max_price: float = None, filters: dict = None, limit: int = 24, offset: int = 0, facets: bool = False):
+    match = {"isActive": "true", **(filters or {})}
+    if min_price is not None or max_price is not None:
+        match["dealPrice"] = {}
+        if min_price is not None:
+            match["dealPrice"]["$gte"] = min_price
+        if max_price is not None:
+            match["dealPrice"]["$lte"] = max_price
+
+    direction = DESCENDING if descending else ASCENDING
+    # $match y $sort van antes de $facet para que MongoDB use los indices {isActive, <campo>, _id}
+    pipeline = [{"$match": match}, {"$sort": {sort or "_id": direction, "_id": direction}}]
+    facet = {
+        "data": [{"$skip": offset}, {"$limit": limit}, {"$project": projection(PRODUCT_FIELDS)}],
+        "total": [{"$count": "count"}]
+    }
+    if facets:
+        for field in PRODUCT_FACET_FIELDS:
+            facet[field] = [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": DESCENDING, "_id": ASCENDING}}]
+    pipeline.append({"$facet": facet})
+
+    result = next(mongo.db.products.aggregate(pipeline), {})
+    total = result.get("total") or [{"count": 0}]
+    response = {
+        "total": total[0]["count"],
+        "data": [map_product(product) for product in result.get("data", [])]
+    }
+    if facets:
+        response["facets"] = {
+            field: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result.get(field, [])]
+            for field in PRODUCT_FACET_FIELDS
+        }
+    return response
 
 # Obtener imagenes del banner
+@cached(catalog_cache, "banner_images")
 def get_banner_images_from_mongo(mongo: PyMongo):
-    banner_images = mongo.db.bannerImages.find()
-    return [
-        {
-            "name": image.get("name"),
-            "imageResources": image.get("imageResources")
-        }
-        for image in banner_images
-    ]
+    banner_images = mongo.db.bannerImages.find({}, projection(BANNER_IMAGE_FIELDS))
+    return [map_document(image, BANNER_IMAGE_FIELDS) for image in banner_images]
 
 # Obtener categorias drawer
+@cached(catalog_cache, "categories")
 def get_categories_from_mongo(mongo: PyMongo):
-    categories = mongo.db.categories.find()
-    return [
-        {
-            "_id": str(category["_id"]),
-            "name": category.get("name"),
-            "subcategories": category.get("subcategories")
-        }
-        for category in categories
-    ]
+    categories = mongo.db.categories.find({}, projection(CATEGORY_FIELDS))
+    return [map_document(category, CATEGORY_FIELDS) for category in categories]
+
+# Datos iniciales del storefront en una sola estructura
+def get_bootstrap_from_mongo(mongo: PyMongo, page_size: int):
+    products, next_cursor = get_products_page(mongo, page_size)
+    banner_images = get_banner_images_from_mongo(mongo)
+    categories = get_categories_from_mongo(mongo)
+    return {
+        "products": {"len": len(products), "nextCursor": next_cursor, "data": products},
+        "bannerImages": {"len": len(banner_images), "data": banner_images},
+        "categories": {"len": len(categories), "data": categories}
+    }
+
+# Campos del producto necesarios para valorizar el carrito
+CHECKOUT_PRODUCT_FIELDS = ("sku", "name", "normalPrice", "dealPrice", "imageResources", "freeShiping")
+
+# Productos activos del carrito en una sola consulta (indice sku_unique)
+def get_checkout_products(mongo: PyMongo, skus):
+    products = mongo.db.products.find(
+        {"sku": {"$in": list(skus)}, "isActive": "true"},
+        projection(CHECKOUT_PRODUCT_FIELDS)
+    )
+    return {product["sku"]: product for product in products}
 
 # Crear pedido
-def create_checkout(mongo: PyMongo, checkout_data: dict):
+# Lanza CheckoutPricingError si el carrito no se puede valorizar
+def create_checkout(mongo: PyMongo, user_id: str, checkout_data: dict):
+    # El pedido siempre pertenece al user del token, no al que indique el body
+    checkout_data["user"] = user_id
+    # Los totales se recalculan con los precios del catalogo, no se usan los del cliente
+    quantities = cart_quantities(checkout_data.get("cartProducts"))
+    price_checkout(checkout_data, quantities, get_checkout_products(mongo, quantities))
     try:
         checkout_data["trxDate"] = datetime.now()
         checkout_data["status"] = "pending"
@@ -64,12 +157,9 @@ def create_checkout(mongo: PyMongo, checkout_data: dict):
         # Validar que todos los campos obligatorios estén presentes
         validate_checkout_data(checkout_data)
 
-        result = mongo.db.orders.insert_one(checkout_data)
-
-        # Obtener y serializar el documento recién creado
-        return serialize_mongo_document(
-            mongo.db.orders.find_one({"_id": result.inserted_id})
-        )
+        # insert_one agrega el _id al dict, no hace falta volver a leerlo
+        mongo.db.orders.insert_one(checkout_data)
+        return serialize_mongo_document(checkout_data)
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
     
@@ -80,73 +170,109 @@ def update_order_status(mongo: PyMongo, update_data: dict):
         if validation:
             return validation.get_json()
         order_id = update_data.get("order_id")
-        found_order = mongo.db.orders.find_one({"_id": ObjectId(order_id)})
-        if not found_order:
-            return None
-        found_order["status"] = update_data.get("update_status")
-        found_order["deliveryDate"] = update_data.get("delivery_date")
-        found_order["lastStatusModificationDate"] = datetime.now()
-        result = mongo.db.orders.update_one({"_id": ObjectId(order_id)}, {"$set": found_order})
-        if result.modified_count > 0:
-            return serialize_mongo_document(
-                mongo.db.orders.find_one({"_id": ObjectId(order_id)})
-            )
+        # Solo los campos del status, sin leer ni reescribir el pedido completo
+        return serialize_mongo_document(mongo.db.orders.find_one_and_update(
+            {"_id": ObjectId(order_id)},
+            {"$set": {
+                "status": update_data.get("update_status"),
+                "deliveryDate": update_data.get("delivery_date"),
+                "lastStatusModificationDate": datetime.now()
+            }},
+            return_document=ReturnDocument.AFTER
+        ))
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)    
 
-# Obtener todos los pedidos de un user
-def get_orders_by_user(mongo: PyMongo, id: str):
-    user = get_user_by_id(mongo, id)
-    orders = mongo.db.orders.find({"user": user.get("_id")})
-    return [
-        {
-            "_id": str(order.get("_id")),
-            "address": order.get("address"),
-            "deliveryDate": str(order.get("deliveryDate")),
-            "email": order.get("email"),
-            "couponFactor": order.get("couponFactor"),
-            "couponAmount": order.get("couponAmount"),
-            "paymentMethod": order.get("paymentMethod"),
-            "cartProducts": [
-                {**product, "_id": str(product["_id"])}
-                for product in order.get("cartProducts", [])
-            ],
-            "subTotalAmount": order.get("subTotalAmount"),
-            "shippingCost": order.get("shippingCost"),
-            "totalAmount": order.get("totalAmount"),
-            "totalWithDiscountAmount": order.get("totalWithDiscountAmount"),
-            "trxDate": str(order.get("trxDate")),
-            "user": order.get("user"),
-            "status": order.get("status"),
-            "lastStatusModificationDate": order.get("lastStatusModificationDate")
-        }
-        for order in orders
-    ]
+# Actualizar el status de varios pedidos en un solo bulk_write (sin orden)
+# updates: [{order_id, update_status, delivery_date}]; retorna un resultado por item, en el mismo orden
+def update_orders_status_bulk(mongo: PyMongo, updates: list):
+    results = [None] * len(updates)
+    operations = []
+    targets = []
+    now = datetime.now()
+    for position, update in enumerate(updates):
+        order_id = update.get("order_id") if isinstance(update, dict) else None
+        if not order_id or not ObjectId.is_valid(order_id) or not all([update.get("update_status"), update.get("delivery_date")]):
+            results[position] = {"order_id": order_id, "result": "invalid"}
+            continue
+        operations.append(UpdateOne({"_id": ObjectId(order_id)}, {"$set": {
+            "status": update["update_status"],
+            "deliveryDate": update["delivery_date"],
+            "lastStatusModificationDate": now
+        }}))
+        targets.append((position, ObjectId(order_id)))
 
-# Obteners todos los pedidos
-def get_orders_from_mongo(mongo: PyMongo):
-    orders = mongo.db.orders.find()
-    return [
-        {
-            "address": order.get("address"),
-            "deliveryDate": order.get("deliveryDate"),
-            "email": order.get("email"),
-            "couponFactor": order.get("couponFactor"),
-            "couponAmount": order.get("couponAmount"),
-            "paymentMethod": order.get("paymentMethod"),
-            "cartProducts": [
-                {**product, "_id": str(product["_id"])}
-                for product in order.get("cartProducts", [])
-            ],
-            "subTotalAmount": order.get("subTotalAmount"),
-            "shippingCost": order.get("shippingCost"),
-            "totalAmount": order.get("totalAmount"),
-            "totalWithDiscountAmount": order.get("totalWithDiscountAmount"),
-            "user": order.get("user"),
-            "trxDate": order.get("trxDate"),
-        }
-        for order in orders
-    ]
+    failed = {}
+    matched = 0
+    if operations:
+        try:
+            matched = mongo.db.orders.bulk_write(operations, ordered=False).matched_count
+        except BulkWriteError as e:
+            matched = e.details.get("nMatched", 0)
+            failed = {error["index"]: error.get("errmsg") for error in e.details.get("writeErrors", [])}
+
+    # bulk_write solo entrega totales: si no todos coincidieron se consulta cuales existen
+    existing = None
+    if matched < len(operations) - len(failed):
+        ids = [order_id for _, order_id in targets]
+        existing = {order["_id"] for order in mongo.db.orders.find({"_id": {"$in": ids}}, {"_id": 1})}
+
+    for index, (position, order_id) in enumerate(targets):
+        if index in failed:
+            results[position] = {"order_id": str(order_id), "result": "failed", "message": failed[index]}
+        elif existing is not None and order_id not in existing:
+            results[position] = {"order_id": str(order_id), "result": "not_found"}
+        else:
+            results[position] = {"order_id": str(order_id), "result": "updated"}
+    return results
+
+# Mapear un pedido a su representacion publica
+def map_order(order: dict, fields=ORDER_FIELDS):
+    return map_document(order, fields, ORDER_RAW_FIELDS)
+
+# Orden de los pedidos de un user: mas recientes primero (indice user_trxDate)
+ORDER_HISTORY_SORT = [("trxDate", DESCENDING), ("_id", DESCENDING)]
+
+# Pagina de pedidos de un user, mas recientes primero, con cursor (trxDate, _id)
+def get_orders_page_by_user(mongo: PyMongo, user_id: str, limit: int, after: tuple = None):
+    query = {"user": user_id}
+    if after:
+        trx_date, order_id = after
+        query["$or"] = [
+            {"trxDate": {"$lt": trx_date}},
+            {"trxDate": trx_date, "_id": {"$lt": order_id}}
+        ]
+    orders = list(mongo.db.orders.find(query, projection(ORDER_FIELDS)).sort(ORDER_HISTORY_SORT).limit(limit + 1))
+    next_cursor = None
+    if len(orders) > limit:
+        last = orders[limit - 1]
+        next_cursor = encode_cursor(last["trxDate"], last["_id"])
+    return [map_order(order) for order in orders[:limit]], next_cursor
+
+# Iterar pedidos para exportacion, del mas antiguo al mas reciente, en lotes del cursor
+# Cada registro lleva el cursor con el que se retoma la exportacion despues de el
+def iter_orders_export(mongo: PyMongo, since: datetime = None, until: datetime = None, after: tuple = None,
+                       batch_size: int = 1000):
+    query = {}
+    if since or until:
+        query["trxDate"] = {}
+        if since:
+            query["trxDate"]["$gte"] = since
+        if until:
+            query["trxDate"]["$lt"] = until
+    if after:
+        trx_date, order_id = after
+        query["$or"] = [
+            {"trxDate": {"$gt": trx_date}},
+            {"trxDate": trx_date, "_id": {"$gt": order_id}}
+        ]
+    orders = mongo.db.orders.find(query, projection(ORDER_FIELDS)) \
+        .sort([("trxDate", ASCENDING), ("_id", ASCENDING)]) \
+        .batch_size(batch_size)
+    for order in orders:
+        record = map_order(order)
+        record["cursor"] = encode_cursor(order["trxDate"], order["_id"])
+        yield record
 
 # Registrar un usuario
 def register_user(mongo: PyMongo, name: str, email: str, address: str, dateOfBirth: str, hashed_info: str, role: str):
@@ -164,31 +290,55 @@ def register_user(mongo: PyMongo, name: str, email: str, address: str, dateOfBir
         # Validar que todos los campos obligatorios estén presentes
         validate_user_data(user_data)
 
-        result = mongo.db.users.insert_one(user_data)
-        
-        # Obtener y serializar el documento recién creado
-        return serialize_mongo_document(
-            mongo.db.users.find_one({"_id": result.inserted_id})
-        )
+        # El indice unico de email debe existir antes de insertar (si no se creo al iniciar)
+        prepare_database(mongo)
+
+        # El indice unico de email rechaza duplicados (DuplicateKeyError) sin consultar antes
+        mongo.db.users.insert_one(user_data)
+
+        # insert_one agrega el _id al dict, no hace falta volver a leerlo
+        return serialize_mongo_document(user_data)
     except ValueError as e:
         return ErrorHandlerMongo.handleDBError(e)
 
+# Si el rol cambia se incrementa tokenVersion para invalidar los tokens emitidos con el rol anterior
+def revoke_tokens_on_role_change(mongo: PyMongo, user_id: str, role: str):
+    user = mongo.db.users.find_one_and_update(
+        {"_id": ObjectId(user_id), "role": {"$ne": role}},
+        {"$inc": {"tokenVersion": 1}},
+        projection={"tokenVersion": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user:
+        user_token_versions.revoke(user_id, user["tokenVersion"])
+
 # Actualizar user
 def update_user(mongo: PyMongo, update_data: dict):
+    prepare_database(mongo)
     try:
         validation = validate_and_filter_update_user(update_data)
         if validation:
             return validation.get_json()
         user_id = update_data.get("_id")
-        update_data.pop("_id")
-        result = mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-        if result.modified_count > 0:
-            return serialize_mongo_document(
-                mongo.db.users.find_one({"_id": ObjectId(user_id)})
-            )
+        if JWT_ROLE_CLAIMS:
+            revoke_tokens_on_role_change(mongo, user_id, update_data.get("role"))
+        # Solo los campos editables; el documento actualizado vuelve en la misma operacion
+        user = mongo.db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": {field: update_data[field] for field in USER_UPDATE_FIELDS if field in update_data}},
+            projection={"password": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        invalidate_cached_user(user_id)
+        return serialize_mongo_document(user)
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
 
+# Reemplazar el hash de la clave de un user (rehash con el costo actual)
+def update_user_password(mongo: PyMongo, user_id: str, hashed_info: str):
+    mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"password": hashed_info}})
+    invalidate_cached_user(user_id)
+
 # Obtener un user
 def get_user_by_id(mongo: PyMongo, _id: str):
     try:
@@ -197,20 +347,58 @@ def get_user_by_id(mongo: PyMongo, _id: str):
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
     
+# Obtener un user cacheado durante el request (y opcionalmente en el proceso con TTL corto)
+def get_cached_user_by_id(mongo: PyMongo, _id: str):
+    request_users = g.setdefault("cached_users", {}) if has_request_context() else {}
+    if _id in request_users:
+        return request_users[_id]
+
+    if USER_CACHE_SCOPE == "process":
+        hit, user = user_cache.get(_id)
+        if hit:
+            request_users[_id] = user
+            return user
+
+    version = user_cache.version
+    user = get_user_by_id(mongo, _id)
+    # Errores de DB (respuestas) no se cachean
+    if user is None or isinstance(user, dict):
+        request_users[_id] = user
+        if USER_CACHE_SCOPE == "process":
+            user_cache.set(_id, user, version)
+    return user
+
+# Descartar un user de la cache (request actual y proceso)
+def invalidate_cached_user(_id: str):
+    if has_request_context():
+        g.setdefault("cached_users", {}).pop(_id, None)
+    user_cache.invalidate(_id)
+
+# Iterar todos los user directamente desde el cursor (sin traer el hash de la clave)
+def iter_users(mongo: PyMongo):
+    users = mongo.db.users.find({}, projection(USER_FIELDS))
+    return (map_document(user, USER_FIELDS) for user in users)
+
 # Obtener todos los user
 def get_users(mongo: PyMongo):
-    users = mongo.db.users.find()
-    return [
-        {
-            "_id": str(user["_id"]),
-            "userName": user.get("userName"),
-            "email": user.get("email"),
-            "address": user.get("address"),
-            "dateOfBirth": user.get("dateOfBirth"),
-            "role": user.get("role")
-        }
-        for user in users
+    return list(iter_users(mongo))
+
+# Pagina de users por _id (keyset), con filtro de rol y busqueda por prefijo de email
+def get_users_page(mongo: PyMongo, limit: int, after: str = None, role: str = None, email_prefix: str = None):
+    query = {}
+    if role:
+        query["role"] = role
+    if email_prefix:
+        # Regex anclada y sin opciones: MongoDB la resuelve como rango sobre el indice de email
+        query["email"] = {"$regex": f"^{re.escape(email_prefix)}"}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    users = [
+        map_document(user, USER_FIELDS)
+        for user in mongo.db.users.find(query, projection(USER_FIELDS)).sort("_id", ASCENDING).limit(limit + 1)
     ]
+    next_cursor = users[limit - 1]["_id"] if len(users) > limit else None
+    return users[:limit], next_cursor
 
 # Obtener un usuario
 def get_user_by_email(mongo: PyMongo, email: str):
@@ -220,26 +408,126 @@ def get_user_by_email(mongo: PyMongo, email: str):
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
 
+# Intentos de insercion de un producto si el SKU asignado ya existe
+SKU_ALLOCATION_ATTEMPTS = 3
+
 # Crear un producto
 def create_product(mongo: PyMongo, product_data: dict):
     try:
         # Validar que todos los campos obligatorios estén presentes
         validate_product_data(product_data)
 
-        # Calcular el próximo id como el total actual de documentos + 1
-        next_id = str(mongo.db.products.count_documents({}) + 1)
+        # El indice sku_unique y el contador deben existir antes de insertar (si no se crearon al iniciar)
+        prepare_database(mongo)
 
-        # Asignar el nuevo `id` al producto
-        product_data["sku"] = next_id
-        result = mongo.db.products.insert_one(product_data)
+        # SKU desde el contador atomico; el indice sku_unique garantiza que no se repita
+        for attempt in range(SKU_ALLOCATION_ATTEMPTS):
+            product_data["sku"] = str(sku_sequence.next(mongo))
+            try:
+                mongo.db.products.insert_one(product_data)
+                break
+            except DuplicateKeyError:
+                # SKU ya usado (contador sin inicializar o SKU cargado a mano): se reajusta el contador
+                if attempt == SKU_ALLOCATION_ATTEMPTS - 1:
+                    raise
+                init_sku_sequence(mongo, force=True)
+        catalog_cache.invalidate()
 
-        # Obtener y serializar el documento recién creado
-        return serialize_mongo_document(
-            mongo.db.products.find_one({"_id": result.inserted_id})
-        )
+        # insert_one agrega el _id al dict, no hace falta volver a leerlo
+        product = serialize_mongo_document(product_data)
+        index_product(product)
+        return product
     except ValueError as e:
         return ErrorHandlerMongo.handleDBError(e)
 
+# Importar productos en lote: un solo bloque de SKUs reservado y un insert_many sin orden
+# Retorna los productos creados; los que siguen chocando con SKUs existentes se reintentan
+def import_products(mongo: PyMongo, products: list):
+    prepare_database(mongo)
+    remaining = list(products)
+    created = []
+    for attempt in range(SKU_ALLOCATION_ATTEMPTS):
+        for product, sku in zip(remaining, sku_sequence.reserve(mongo, len(remaining))):
+            product["sku"] = str(sku)
+        try:
+            mongo.db.products.insert_many(remaining, ordered=False)
+            created.extend(remaining)
+            remaining = []
+        except BulkWriteError as e:
+            duplicated = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") == 11000}
+            if len(duplicated) != len(e.details.get("writeErrors", [])) or attempt == SKU_ALLOCATION_ATTEMPTS - 1:
+                raise
+            created.extend(product for index, product in enumerate(remaining) if index not in duplicated)
+            remaining = [product for index, product in enumerate(remaining) if index in duplicated]
+            for product in remaining:
+                product.pop("_id", None)
+            init_sku_sequence(mongo, force=True)
+        if not remaining:
+            break
+
+    catalog_cache.invalidate()
+    created = [serialize_mongo_document(product) for product in created]
+    for product in created:
+        index_product(product)
+    return created
+
+# Inicializar el contador de SKUs sobre el mayor SKU numerico existente (una sola vez)
+def init_sku_sequence(mongo: PyMongo, force: bool = False):
+    if not force and sku_sequence.is_seeded(mongo):
+        return
+    skus = (product.get("sku") for product in mongo.db.products.find({}, {"sku": 1, "_id": 0}))
+    sku_sequence.seed(mongo, max((int(sku) for sku in skus if str(sku).isdigit()), default=0))
+
+# SKUs y emails repetidos reciben valores nuevos para poder crear sus indices unicos
+# Solo corre mientras el indice no existe (datos anteriores al contador de SKUs); se conserva el documento mas antiguo
+# y los que no tienen el campo reciben todos un valor nuevo. Retorna los cambios hechos
+def fix_duplicated_unique_values(mongo: PyMongo):
+    changes = []
+    if "sku_unique" not in mongo.db.products.index_information():
+        duplicated = []
+        for group in duplicated_values(mongo, "products", "sku"):
+            ids = sorted(group["ids"])
+            duplicated.extend(ids if group["_id"] is None else ids[1:])
+        if duplicated:
+            init_sku_sequence(mongo, force=True)
+            for product_id, sku in zip(duplicated, sku_sequence.reserve(mongo, len(duplicated))):
+                mongo.db.products.update_one({"_id": product_id}, {"$set": {"sku": str(sku)}})
+                changes.append(f"products.{product_id}: sku {sku}")
+    if "email_unique" not in mongo.db.users.index_information():
+        for group in duplicated_values(mongo, "users", "email"):
+            ids = sorted(group["ids"])
+            # El email queda invalido para login; un admin puede corregirlo desde la edicion de users
+            for user_id in (ids if group["_id"] is None else ids[1:]):
+                email = f"duplicate-{user_id}-{group['_id']}" if group["_id"] is not None else f"duplicate-{user_id}"
+                mongo.db.users.update_one({"_id": user_id}, {"$set": {"email": email}})
+                changes.append(f"users.{user_id}: email {email}")
+    return changes
+
+# Preparar MongoDB una vez por proceso: duplicados, indices declarados y contador de SKUs
+# Retorna (cambios por duplicados, indices opcionales no creados) o None si ya estaba preparado
+# Lanza RuntimeError si no se puede crear un indice requerido (no se escribe sin el)
+def prepare_database(mongo: PyMongo):
+    def setup():
+        changes = fix_duplicated_unique_values(mongo)
+        failed = ensure_indexes(mongo)
+        init_sku_sequence(mongo)
+        return changes, failed
+    return database_setup.run(setup)
+
+# Mantener el indice de busqueda al dia (solo productos activos)
+def index_product(product: dict):
+    if not product:
+        return
+    if product.get("isActive") == "true":
+        product_search_index.add(map_product(product))
+    else:
+        product_search_index.remove(product["_id"])
+
+# Buscar productos en el indice invertido (sin consultar MongoDB salvo al reconstruirlo)
+def search_products(mongo: PyMongo, query: str, limit: int, offset: int = 0):
+    product_search_index.ensure_fresh(lambda: iter_products_from_mongo(mongo))
+    return product_search_index.search(query, limit, offset)
+
 # Obtener un producto por su SKU
 def get_product_by_sku(mongo: PyMongo, product_sku: str):
     try:
@@ -251,35 +539,35 @@ def get_product_by_sku(mongo: PyMongo, product_sku: str):
 # Obtener todos los productos de una categoria
 def get_products_by_category(mongo: PyMongo, product_category: str):
     try:
-        products = [product for product in get_products_from_mongo(mongo) if product["category"] == product_category]
-        return products
+        return get_products_from_mongo(mongo, {"category": product_category})
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
 
 # Obtener todos los productos de una sub categoria
 def get_products_by_subCategory(mongo: PyMongo, product_category: str, product_subCategory: str):
     try:
-        products = [product for product in get_products_by_category(mongo, product_category) if product["subCategory"] == product_subCategory]
-        return products
+        return get_products_from_mongo(mongo, {"category": product_category, "subCategory": product_subCategory})
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)    
 
-# Actualizar un producto por su SKU
+# Actualizar un producto por su _id
 def update_product(mongo: PyMongo, update_data: dict):
     try:
         validation = validate_and_filter_update_product(update_data)
         if validation:
             return validation.get_json()
         product_id = update_data.get("_id")
-        update_data.pop("_id")
-        update_data.pop("imageResources")
-        update_data.pop("rating")
-        update_data.pop("uploadDateTime")
-        result = mongo.db.products.update_one({"_id": ObjectId(product_id)}, {"$set": update_data})
-        if result.modified_count > 0:
-            return serialize_mongo_document(
-                mongo.db.products.find_one({"_id": ObjectId(product_id)})
-            )
+        # imageResources, rating y uploadDateTime no se editan desde aqui
+        product = mongo.db.products.find_one_and_update(
+            {"_id": ObjectId(product_id)},
+            {"$set": {field: update_data[field] for field in PRODUCT_UPDATE_FIELDS if field in update_data}},
+            return_document=ReturnDocument.AFTER
+        )
+        if product:
+            catalog_cache.invalidate()
+            product = serialize_mongo_document(product)
+            index_product(product)
+            return product
     except Exception as e:
         return ErrorHandlerMongo.handleDBError(e)
 
@@ -289,8 +577,12 @@ def delete_user(mongo: PyMongo, user_id: str):
         if not user_id:
             return {"success": False, "error": "Missing ID"}
         result = mongo.db.users.delete_one({"_id": ObjectId(user_id)})
+        invalidate_cached_user(user_id)
         if result.deleted_count == 0:
             return {"success": False, "error": "User not found"}
+        # Solo los tokens con rol en los claims evitan la consulta del user; sin ellos el borrado basta
+        if JWT_ROLE_CLAIMS:
+            user_token_versions.revoke(user_id)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -303,34 +595,17 @@ def delete_product(mongo: PyMongo, product_id: str):
         result = mongo.db.products.delete_one({"_id": ObjectId(product_id)})
         if result.deleted_count == 0:
             return {"success": False, "error": "Product not found"}
+        catalog_cache.invalidate()
+        product_search_index.remove(product_id)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-# Obtener todos los pedidos de un user    
+# Iterar los pedidos de un user_id directamente desde el cursor
+def iter_orders_by_user_id(mongo: PyMongo, user_id: str):
+    orders = mongo.db.orders.find({"user": user_id}, projection(ORDER_FIELDS)).sort(ORDER_HISTORY_SORT)
+    return (map_order(order) for order in orders)
+
+# Obtener todos los pedidos de un user
 def get_orders_by_user_id(mongo: PyMongo, user_id: str):
-    orders = mongo.db.orders.find({"user": user_id})
-    return [
-        {
-            "_id": str(order.get("_id")),
-            "address": order.get("address"),
-            "deliveryDate": str(order.get("deliveryDate")),
-            "email": order.get("email"),
-            "couponFactor": order.get("couponFactor"),
-            "couponAmount": order.get("couponAmount"),
-            "paymentMethod": order.get("paymentMethod"),
-            "cartProducts": [
-                {**product, "_id": str(product["_id"])}
-                for product in order.get("cartProducts", [])
-            ],
-            "subTotalAmount": order.get("subTotalAmount"),
-            "shippingCost": order.get("shippingCost"),
-            "totalAmount": order.get("totalAmount"),
-            "totalWithDiscountAmount": order.get("totalWithDiscountAmount"),
-            "trxDate": str(order.get("trxDate")),
-            "user": order.get("user"),
-            "status": order.get("status"),
-            "lastStatusModificationDate": order.get("lastStatusModificationDate")
-        }
-        for order in orders
-    ]
+    return list(iter_orders_by_user_id(mongo, user_id))
@@ -0,0 +1,131 @@
+from flask_pymongo import PyMongo
+from pymongo import ASCENDING, DESCENDING
+import os
+import pymongo
+from threading import Lock
+from pymongo.errors import OperationFailure
+from .idempotency import IDEMPOTENCY_TTL
+
+## INDICES ##
+
+# Indices declarados por coleccion: (llaves, opciones)
+INDEXES = {
+    "products": [
+        (
+            [("isActive", ASCENDING), ("category", ASCENDING), ("subCategory", ASCENDING)],
+            {"name": "isActive_category_subCategory"}
+        ),
+        (
+            [("isActive", ASCENDING), ("_id", ASCENDING)],
+            {"name": "isActive_id"}
+        ),
+        (
+            [("isActive", ASCENDING), ("dealPrice", ASCENDING), ("_id", ASCENDING)],
+            {"name": "isActive_dealPrice_id"}
+        ),
+        (
+            [("isActive", ASCENDING), ("rating", ASCENDING), ("_id", ASCENDING)],
+            {"name": "isActive_rating_id"}
+        ),
+        (
+            [("isActive", ASCENDING), ("discountPercentage", ASCENDING), ("_id", ASCENDING)],
+            {"name": "isActive_discountPercentage_id"}
+        ),
+        (
+            [("sku", ASCENDING)],
+            {"name": "sku_unique", "unique": True}
+        ),
+    ],
+    "users": [
+        (
+            [("email", ASCENDING)],
+            {"name": "email_unique", "unique": True}
+        ),
+        (
+            [("role", ASCENDING), ("_id", ASCENDING)],
+            {"name": "role_id"}
+        ),
+    ],
+    "orders": [
+        (
+            # Historial por user, mas recientes primero; tambien cubre las consultas solo por user
+            [("user", ASCENDING), ("trxDate", DESCENDING), ("_id", DESCENDING)],
+            {"name": "user_trxDate"}
+        ),
+        (
+            # Exportacion por rango de fechas con cursor (trxDate, _id)
+            [("trxDate", DESCENDING), ("_id", DESCENDING)],
+            {"name": "trxDate_id"}
+        ),
+    ],
+    "idempotency_keys": [
+        (
+            [("createdAt", ASCENDING)],
+            {"name": "createdAt_ttl", "expireAfterSeconds": IDEMPOTENCY_TTL}
+        ),
+    ],
+}
+
+# Indices de los que depende la unicidad de datos (register y SKUs no consultan antes de insertar)
+REQUIRED_INDEXES = {("users", "email_unique"), ("products", "sku_unique")}
+
+# Grupos de documentos con el mismo valor en `field` (incluye documentos sin el campo, agrupados en None)
+def duplicated_values(mongo: PyMongo, collection: str, field: str):
+    return mongo.db[collection].aggregate([
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ])
+
+# Segundos maximos para comprobar MongoDB al iniciar (en vez del server selection timeout por defecto)
+MONGO_STARTUP_TIMEOUT = float(os.getenv("MONGO_STARTUP_TIMEOUT", 5))
+
+# True si MongoDB responde dentro de MONGO_STARTUP_TIMEOUT
+def mongo_available(mongo: PyMongo):
+    try:
+        with pymongo.timeout(MONGO_STARTUP_TIMEOUT):
+            mongo.db.command("ping")
+        return True
+    except pymongo.errors.PyMongoError:
+        return False
+
+# Crear los indices declarados (idempotente, se ejecuta al iniciar la app)
+# Retorna los indices que no se pudieron crear (p.ej. unique con duplicados existentes)
+# Lanza RuntimeError si falla alguno de REQUIRED_INDEXES
+def ensure_indexes(mongo: PyMongo):
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                mongo.db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                if (collection, options["name"]) in REQUIRED_INDEXES:
+                    raise RuntimeError(f"Required MongoDB index {collection}.{options['name']} could not be created: {str(e)}")
+                failed.append(f"{collection}.{options['name']}: {str(e)}")
+    return failed
+
+
+class DatabaseSetup:
+    """Preparacion de MongoDB (indices, datos previos) que corre una vez por proceso.
+
+    Se ejecuta al iniciar la app; si MongoDB no respondia en ese momento, las
+    escrituras que dependen de los indices unicos la ejecutan antes de insertar.
+    Si falla no queda marcada como lista y se reintenta en la siguiente llamada.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = Lock()
+
+    # Ejecuta `setup` si aun no se completo; retorna su resultado o None si ya estaba lista
+    def run(self, setup):
+        if self.ready:
+            return None
+        with self._lock:
+            if self.ready:
+                return None
+            result = setup()
+            self.ready = True
+            return result
+
+
+database_setup = DatabaseSetup()
@@ -0,0 +1,144 @@
+import hashlib
+import math
+import os
+import time
+from threading import Lock
+
+## DENYLIST DE TOKENS (JTI) ##
+
+class BloomFilter:
+    """Filtro de Bloom en memoria: sin falsos negativos, falsos positivos acotados por error_rate."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Doble hashing (Kirsch-Mitzenmacher) sobre un solo digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class MemoryDenylistBackend:
+    """JTIs revocados en el proceso (jti -> exp)."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    def add(self, jti: str, expires_at: int):
+        with self._lock:
+            self._entries[jti] = expires_at
+
+    def contains(self, jti: str):
+        expires_at = self._entries.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    # JTIs vigentes; los expirados se descartan
+    def active(self):
+        now = time.time()
+        with self._lock:
+            self._entries = {jti: exp for jti, exp in self._entries.items() if exp > now}
+            return list(self._entries)
+
+
+class RedisDenylistBackend:
+    """JTIs revocados en Redis; cada llave expira junto con el token."""
+
+    KEY_PREFIX = "denylist:"
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def add(self, jti: str, expires_at: int):
+        self._redis.set(f"{self.KEY_PREFIX}{jti}", 1, exat=int(expires_at))
+
+    def contains(self, jti: str):
+        return bool(self._redis.exists(f"{self.KEY_PREFIX}{jti}"))
+
+    def active(self):
+        prefix_length = len(self.KEY_PREFIX)
+        return [key.decode()[prefix_length:] for key in self._redis.scan_iter(f"{self.KEY_PREFIX}*", count=1000)]
+
+
+class TokenDenylist:
+    """Denylist con un filtro de Bloom local delante del backend.
+
+    Un JTI que no esta en el filtro no fue revocado y se responde sin salir del
+    proceso; solo un acierto del filtro se confirma en el backend. El filtro se
+    reconstruye desde el backend cada `sync_interval` segundos para descartar
+    los tokens expirados y, con el backend de Redis, recoger revocaciones
+    hechas por otros workers (el backend en memoria solo ve este proceso).
+    """
+
+    def __init__(self, backend, capacity: int, error_rate: float, sync_interval: int):
+        self.backend = backend
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._synced_at = 0.0
+        self._lock = Lock()
+        self.checks = 0
+        self.bloom_hits = 0
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if now - self._synced_at < self.sync_interval:
+                return
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            for jti in self.backend.active():
+                bloom.add(jti)
+            self._bloom = bloom
+            self._synced_at = now
+
+    def revoke(self, jti: str, expires_at: int):
+        if expires_at <= time.time():
+            return
+        # Bajo el lock para no perder la revocacion si el filtro se reconstruye en paralelo
+        with self._lock:
+            self.backend.add(jti, expires_at)
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti: str):
+        try:
+            self._sync()
+        except Exception:
+            # Si el backend no responde se mantiene el filtro anterior
+            pass
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        return self.backend.contains(jti)
+
+    def stats(self):
+        return {"checks": self.checks, "bloom_hits": self.bloom_hits}
+
+
+def create_denylist_backend(uri: str):
+    if uri.startswith(("redis://", "rediss://")):
+        return RedisDenylistBackend(uri)
+    return MemoryDenylistBackend()
+
+
+token_denylist = TokenDenylist(
+    # Por defecto el mismo Redis del rate limit, para que un logout valga en todos los workers
+    backend=create_denylist_backend(os.getenv("DENYLIST_STORAGE_URI", os.getenv("REDIS_STORAGE_URI", "memory://"))),
+    capacity=int(os.getenv("DENYLIST_BLOOM_CAPACITY", 100000)),
+    error_rate=float(os.getenv("DENYLIST_BLOOM_ERROR_RATE", 0.001)),
+    sync_interval=int(os.getenv("DENYLIST_SYNC_INTERVAL", 10))
+)
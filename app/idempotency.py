@@ -0,0 +1,106 @@
+import os
+import time
+from datetime import datetime, timedelta
+from flask_pymongo import PyMongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+## IDEMPOTENCY KEYS ##
+
+# Segundos que se conserva una respuesta (indice TTL sobre createdAt)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 86400))
+
+# Segundos que un reintento concurrente espera a que termine el request original
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", 5))
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+IDEMPOTENCY_MAX_POLL_INTERVAL = 1.0
+
+# Segundos que un request retiene la llave; si su worker muere, otro reintento la toma al vencer
+IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE", 30))
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+PENDING = "pending"
+DONE = "done"
+
+
+class IdempotencyStore:
+    """Respuestas guardadas por (user, metodo, ruta, Idempotency-Key) en MongoDB.
+
+    El primer request inserta un documento "pending" (el _id unico hace de lock
+    entre workers), ejecuta el handler y guarda la respuesta. Los reintentos
+    leen ese documento por _id y la reenvian sin volver a ejecutar el handler;
+    si el original sigue en curso esperan hasta `IDEMPOTENCY_WAIT` segundos.
+    La llave "pending" se retiene por `lease` segundos (lockedUntil): si el
+    worker que la tomo muere, el siguiente reintento la toma al vencer.
+    """
+
+    collection = "idempotency_keys"
+
+    def __init__(self, wait: float, poll_interval: float, max_poll_interval: float, lease: int):
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.lease = lease
+        self.replays = 0
+        self.takeovers = 0
+
+    # Reserva la llave; retorna None si se obtuvo o el documento existente si ya estaba tomada
+    def begin(self, mongo: PyMongo, key: str, fingerprint: str):
+        now = datetime.utcnow()
+        try:
+            mongo.db[self.collection].insert_one({
+                "_id": key,
+                "state": PENDING,
+                "fingerprint": fingerprint,
+                "createdAt": now,
+                "lockedUntil": now + timedelta(seconds=self.lease)
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        # Tomar una llave pendiente cuyo dueño no termino dentro del lease (mismo request)
+        taken = mongo.db[self.collection].find_one_and_update(
+            {"_id": key, "state": PENDING, "fingerprint": fingerprint,
+             "$or": [{"lockedUntil": {"$lt": now}}, {"lockedUntil": {"$exists": False}}]},
+            {"$set": {"lockedUntil": now + timedelta(seconds=self.lease)}},
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if taken:
+            self.takeovers += 1
+            return None
+        return mongo.db[self.collection].find_one({"_id": key})
+
+    # Esperar a que el request original guarde su respuesta (o a que venza su lease)
+    def wait_for(self, mongo: PyMongo, key: str):
+        deadline = time.monotonic() + self.wait
+        interval = self.poll_interval
+        while time.monotonic() < deadline:
+            time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+            interval = min(interval * 2, self.max_poll_interval)
+            record = mongo.db[self.collection].find_one({"_id": key})
+            if record is None or record["state"] == DONE or record.get("lockedUntil", datetime.min) < datetime.utcnow():
+                return record
+        return None
+
+    def complete(self, mongo: PyMongo, key: str, status: int, body: bytes, mimetype: str):
+        mongo.db[self.collection].update_one(
+            {"_id": key},
+            {"$set": {"state": DONE, "status": status, "body": body, "mimetype": mimetype}}
+        )
+
+    # Liberar la llave (errores 5xx o excepciones) para permitir un nuevo intento
+    def release(self, mongo: PyMongo, key: str):
+        mongo.db[self.collection].delete_one({"_id": key, "state": PENDING})
+
+    def stats(self):
+        return {"replays": self.replays, "takeovers": self.takeovers}
+
+
+idempotency_store = IdempotencyStore(
+    wait=IDEMPOTENCY_WAIT,
+    poll_interval=IDEMPOTENCY_POLL_INTERVAL,
+    max_poll_interval=IDEMPOTENCY_MAX_POLL_INTERVAL,
+    lease=IDEMPOTENCY_LEASE
+)
@@ -0,0 +1,186 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from flask import g
+from flask_limiter.util import get_remote_address
+from limits import parse_many
+from limits.strategies import STRATEGIES, FixedWindowRateLimiter
+from limits.util import WindowStats
+
+## RATE LIMIT EN DOS NIVELES ##
+
+class _LocalBudget:
+    __slots__ = ("remote", "pending", "synced_at")
+
+    def __init__(self, remote: int, synced_at: float):
+        self.remote = remote
+        self.pending = 0
+        self.synced_at = synced_at
+
+
+class TwoTierRateLimiter(FixedWindowRateLimiter):
+    """Ventana fija con un presupuesto local por llave delante del storage (Redis).
+
+    Mientras el ultimo conteo conocido del storage mas los hits locales queden
+    bajo `amount * (1 - headroom)`, los hits se aceptan en memoria y se envian al
+    storage en lote (cada `sync_interval` segundos o `max_batch` hits). Cerca del
+    limite cada hit se sincroniza, asi que la decision final siempre la toma el
+    storage. Con W workers el exceso maximo sobre el limite es
+    W * min(max_batch, amount * (1 - headroom)).
+    """
+
+    sync_interval = float(os.getenv("RATELIMIT_LOCAL_SYNC_INTERVAL", 2))
+    max_batch = int(os.getenv("RATELIMIT_LOCAL_MAX_BATCH", 10))
+    headroom = float(os.getenv("RATELIMIT_LOCAL_HEADROOM", 0.2))
+    max_keys = int(os.getenv("RATELIMIT_LOCAL_MAX_KEYS", 10000))
+
+    def __init__(self, storage):
+        super().__init__(storage)
+        self._budgets = OrderedDict()
+        self._lock = Lock()
+        self.local_hits = 0
+        self.remote_syncs = 0
+
+    def _take_local(self, key, item, cost, now):
+        budget = self._budgets.get(key)
+        if budget is None:
+            return False
+        ceiling = item.amount * (1 - self.headroom)
+        if (now - budget.synced_at < self.sync_interval
+                and budget.pending + cost <= self.max_batch
+                and budget.remote + budget.pending + cost <= ceiling):
+            budget.pending += cost
+            self._budgets.move_to_end(key)
+            self.local_hits += 1
+            return True
+        return False
+
+    def hit(self, item, *identifiers, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        now = time.monotonic()
+        with self._lock:
+            if self._take_local(key, item, cost, now):
+                return True
+            budget = self._budgets.pop(key, None)
+            pending = budget.pending if budget else 0
+
+        # El conteo del storage incluye los hits locales pendientes de este worker
+        count = self.storage.incr(key, item.get_expiry(), elastic_expiry=False, amount=pending + cost)
+
+        with self._lock:
+            self.remote_syncs += 1
+            self._budgets[key] = _LocalBudget(count, now)
+            while len(self._budgets) > self.max_keys:
+                self._budgets.popitem(last=False)
+        return count <= item.amount
+
+    def _pending(self, key):
+        budget = self._budgets.get(key)
+        return budget.pending if budget else 0
+
+    def test(self, item, *identifiers, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        return self.storage.get(key) + self._pending(key) < item.amount - cost + 1
+
+    def get_window_stats(self, item, *identifiers) -> WindowStats:
+        key = item.key_for(*identifiers)
+        remaining = max(0, item.amount - self.storage.get(key) - self._pending(key))
+        return WindowStats(self.storage.get_expiry(key), remaining)
+
+    def clear(self, item, *identifiers) -> None:
+        key = item.key_for(*identifiers)
+        with self._lock:
+            self._budgets.pop(key, None)
+        return super().clear(item, *identifiers)
+
+    def stats(self):
+        return {"local_hits": self.local_hits, "remote_syncs": self.remote_syncs, "keys": len(self._budgets)}
+
+
+# Disponible como RATELIMIT_STRATEGY=two-tier
+STRATEGIES["two-tier"] = TwoTierRateLimiter
+
+
+## LLAVES Y NIVELES DE LIMITE ##
+
+# Limites por grupo de rutas y nivel (anonymous, user, admin); un string aplica a todos los niveles
+DEFAULT_RATE_LIMIT_TIERS = {
+    "catalog": {"anonymous": "5 per minute", "user": "30 per minute", "admin": "60 per minute"},
+    "search": {"anonymous": "10 per minute", "user": "60 per minute", "admin": "120 per minute"},
+    "auth": "3 per 2 minute",
+    "refresh": "2 per 5 minute",
+    "account": "3 per 5 minute",
+    "checkout": "2 per minute",
+    "orders": {"anonymous": "2 per minute", "user": "10 per minute", "admin": "30 per minute"},
+    # Sin claims de rol un admin se ve como "user" al limitar; las rutas admin rechazan a los no admin
+    "admin": {"anonymous": "10 per minute", "user": "120 per minute", "admin": "120 per minute"},
+}
+
+RATE_LIMIT_LEVELS = ("anonymous", "user", "admin")
+
+# Cargar la tabla de limites (JSON en RATE_LIMIT_TIERS, inline o ruta a un archivo) sobre los valores por defecto
+def load_rate_limit_tiers(raw: str = None):
+    tiers = dict(DEFAULT_RATE_LIMIT_TIERS)
+    if raw:
+        if os.path.isfile(raw):
+            with open(raw) as tiers_file:
+                raw = tiers_file.read()
+        tiers.update(json.loads(raw))
+
+    table = {}
+    for group, limits_by_level in tiers.items():
+        if isinstance(limits_by_level, str):
+            limits_by_level = {level: limits_by_level for level in RATE_LIMIT_LEVELS}
+        table[group] = {
+            level: limits_by_level.get(level, limits_by_level.get("anonymous"))
+            for level in RATE_LIMIT_LEVELS
+        }
+        # Falla al iniciar si algun limite no se puede parsear
+        for value in table[group].values():
+            parse_many(value)
+    return table
+
+
+rate_limit_tiers = load_rate_limit_tiers(os.getenv("RATE_LIMIT_TIERS"))
+
+# Rol de un user ya presente en la cache del request o del proceso (no consulta MongoDB)
+def _known_role(identity: str):
+    from app.cache import user_cache, USER_CACHE_SCOPE
+    user = g.get("cached_users", {}).get(identity)
+    if user is None and USER_CACHE_SCOPE == "process":
+        _, user = user_cache.get(identity)
+    return user.get("role") if isinstance(user, dict) else None
+
+# Identidad y nivel del request (se resuelven una vez por request)
+def _resolve_requester():
+    if "rate_limit_level" in g:
+        return g.rate_limit_identity, g.rate_limit_level
+
+    from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+
+    identity, level = None, "anonymous"
+    try:
+        verify_jwt_in_request(optional=True, locations=["headers"])
+        identity = get_jwt_identity()
+        if identity:
+            # Sin consultar MongoDB: rol del claim o de un user ya cargado; si no, nivel user
+            role = get_jwt().get("role") or _known_role(identity)
+            level = "admin" if role == "admin" else "user"
+    except Exception:
+        # Token invalido o expirado: se limita como anonimo por IP
+        identity, level = None, "anonymous"
+
+    g.rate_limit_identity, g.rate_limit_level = identity, level
+    return identity, level
+
+# Llave del limite: identidad del JWT si existe, si no la IP
+def rate_limit_key():
+    identity, _ = _resolve_requester()
+    return f"user:{identity}" if identity else f"ip:{get_remote_address()}"
+
+# Limite dinamico para @limiter.limit segun el nivel del request
+def tier_limit(group: str):
+    levels = rate_limit_tiers[group]
+    return lambda: levels[_resolve_requester()[1]]
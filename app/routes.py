@@ -1,17 +1,27 @@
 import os
-from flask import Blueprint, Response, request, jsonify, make_response
+from flask import Blueprint, Response, request, jsonify, make_response, current_app, json
 from .crud import (
-    get_users, update_user, delete_user, register_user, get_user_by_email, update_order_status,delete_product,
-    get_products_from_mongo, update_product, get_product_by_sku, get_categories_from_mongo,
-    create_product, get_products_by_category, get_products_by_subCategory, get_user_by_id, get_orders_by_user_id,
-    get_banner_images_from_mongo, create_checkout, get_orders_from_mongo, get_orders_by_user, update_user
+    get_users, get_users_page, update_user, delete_user, register_user, get_user_by_email, update_order_status, update_orders_status_bulk, delete_product,
+    get_products_from_mongo, get_products_page, update_product, get_product_by_sku, get_categories_from_mongo,
+    create_product, import_products, get_products_by_category, get_products_by_subCategory, get_cached_user_by_id,
+    get_banner_images_from_mongo, create_checkout, iter_orders_export, get_orders_page_by_user, update_user,
+    iter_products_from_mongo, iter_users, iter_orders_by_user_id, get_bootstrap_from_mongo,
+    search_products, browse_products, PRODUCT_SORT_FIELDS, ORDER_FIELDS, update_user_password
 )
-from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from middlewares.middlewares import jwt_required_middleware
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, decode_token
+from middlewares.middlewares import jwt_required_middleware, conditional_get_middleware, idempotent_middleware
 from app import mongo, limiter
+from .cache import catalog_cache, bootstrap_snapshot, user_cache
+from .streaming import stream_envelope, stream_ndjson, stream_csv
+from .services import decode_cursor, CheckoutPricingError, validate_product_data
+from .auth import build_user_claims, password_hasher, HashingPoolSaturated
+from .denylist import token_denylist
+from .idempotency import idempotency_store
+from .ratelimit import tier_limit
 from handlers.error_handler import ErrorHandler
 from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 
 main = Blueprint('main', __name__)
@@ -35,13 +45,21 @@ def handle_login(role_required=None):
         if role_required and user.get('role') != role_required:
             return ErrorHandler.unauthorized_error("Requires admin role r")
         
-        if not check_password_hash(user.get('password'), info):
+        if not password_hasher.verify(user.get('password'), info):
             return ErrorHandler.invalid_credentials_error("r")
-        
+
+        # Rehash transparente si cambio el costo configurado (un fallo aqui no impide el login)
+        if password_hasher.needs_rehash(user.get('password')):
+            try:
+                update_user_password(mongo, user.get('_id'), password_hasher.hash(info))
+            except Exception:
+                pass
+
         user.pop('password', None)
 
-        access_token = create_access_token(identity=str(user.get('_id')), fresh=True)
-        refresh_token = create_refresh_token(identity=str(user.get('_id')))
+        claims = build_user_claims(user)
+        access_token = create_access_token(identity=str(user.get('_id')), fresh=True, additional_claims=claims)
+        refresh_token = create_refresh_token(identity=str(user.get('_id')), additional_claims=claims)
 
         response = make_response(
             jsonify({
@@ -69,6 +87,8 @@ def handle_login(role_required=None):
         )
 
         return response
+    except HashingPoolSaturated:
+        return ErrorHandler.service_unavailable_error("Too many concurrent logins, please retry r")
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error during authentication r: {str(e)}")
 
@@ -85,36 +105,120 @@ def handle_register(role_required=None):
     if not all([name, email, address, dateOfBirth, data.get('info')]):
         return ErrorHandler.bad_request_error("Missing required fields r")
 
-    existingUser = get_user_by_email(mongo, email)
-    if existingUser: 
-        return ErrorHandler.not_acceptable_error("Email already exist r")
-
     role = 'user'
     if role_required and role_required == 'admin':
         role = 'admin'        
 
     try:
         info = data.get('info')
-        hashed_info = generate_password_hash(info)
+        hashed_info = password_hasher.hash(info)
         user = register_user(mongo, name, email, address, dateOfBirth, hashed_info, role)
         return jsonify({"code": "201", "message": f"User registered successfully: {user.get('userName')}"}), 201
     
+    except DuplicateKeyError:
+        return ErrorHandler.not_acceptable_error("Email already exist r")
+    except HashingPoolSaturated:
+        return ErrorHandler.service_unavailable_error("Too many concurrent registrations, please retry r")
     except Exception as e:
         return ErrorHandler.internal_server_error(f"error when registering user r: {str(e)}")
 
+# Leer limit/after de la query; limit se acota al maximo configurado
+def get_page_args(default_size_key, max_size_key, parse_cursor=None):
+    limit = request.args.get("limit", current_app.config[default_size_key], type=int)
+    if not limit or limit < 1:
+        raise ValueError("limit must be a positive integer")
+    after = request.args.get("after")
+    if after and parse_cursor:
+        after = parse_cursor(after)
+    elif after and not ObjectId.is_valid(after):
+        raise ValueError("invalid cursor")
+    return min(limit, current_app.config[max_size_key]), after
+
+# Codificar el bootstrap una vez por version del catalogo
+def encode_bootstrap():
+    return json.dumps({
+        "code": "200",
+        "message": "Fetch bootstrap successfully",
+        "data": get_bootstrap_from_mongo(mongo, current_app.config["PRODUCTS_PAGE_SIZE"])
+    }).encode("utf-8")
+
+BROWSE_ARGS = ("sort", "order", "minPrice", "maxPrice", "category", "subCategory", "facets", "offset")
+
+def browse_products_response():
+    sort = request.args.get("sort")
+    if sort and sort not in PRODUCT_SORT_FIELDS:
+        return ErrorHandler.bad_request_error(f"sort must be one of {', '.join(PRODUCT_SORT_FIELDS)} r")
+    order = request.args.get("order", "asc")
+    if order not in ("asc", "desc"):
+        return ErrorHandler.bad_request_error("order must be asc or desc r")
+    min_price = request.args.get("minPrice", type=float)
+    max_price = request.args.get("maxPrice", type=float)
+    limit = request.args.get("limit", current_app.config["PRODUCTS_PAGE_SIZE"], type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if not limit or limit < 1 or offset < 0:
+        return ErrorHandler.bad_request_error("Invalid pagination parameters r")
+    filters = {field: request.args[field] for field in ("category", "subCategory") if request.args.get(field)}
+    facets = request.args.get("facets") == "true"
+
+    result = browse_products(
+        mongo, sort=sort, descending=order == "desc", min_price=min_price, max_price=max_price, filters=filters,
+        limit=min(limit, current_app.config["PRODUCTS_MAX_PAGE_SIZE"]), offset=offset, facets=facets
+    )
+    response = {
+        "code": "200",
+        "len": len(result["data"]),
+        "total": result["total"],
+        "message": "Fetch products successfully",
+        "data": result["data"]
+    }
+    if facets:
+        response["facets"] = result["facets"]
+    return jsonify(response), 200
+
+# Agregar el jti de un token a la denylist hasta su expiracion (tokens invalidos o expirados se ignoran)
+def revoke_token(encoded_token):
+    try:
+        decoded = decode_token(encoded_token)
+    except Exception:
+        return
+    token_denylist.revoke(decoded["jti"], decoded["exp"])
+
 
 ## RUTAS WEB ##
 
 # Endpoint para obtener todos los productos
 @main.route('/api/v1/products', methods=['GET'])
-@limiter.limit("5 per minute")  
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("products")
 def get_products():
     try:
-        product_list = get_products_from_mongo(mongo)
+        # Navegacion con orden, rango de precio y facetas (agregacion en MongoDB)
+        if any(arg in request.args for arg in BROWSE_ARGS):
+            return browse_products_response()
+
+        # Listado completo sin paginar para clientes antiguos
+        if request.args.get("all") == "true":
+            if request.args.get("stream") == "true":
+                return stream_envelope(iter_products_from_mongo(mongo), "Fetch products successfully")
+            product_list = get_products_from_mongo(mongo)
+            return jsonify({
+                "code": "200",
+                "len": len(product_list),
+                "message": "Fetch products successfully",
+                "data": product_list
+            }), 200
+
+        try:
+            limit, after = get_page_args("PRODUCTS_PAGE_SIZE", "PRODUCTS_MAX_PAGE_SIZE")
+        except ValueError as e:
+            return ErrorHandler.bad_request_error(f"{str(e)} r")
+
+        product_list, next_cursor = get_products_page(mongo, limit, after)
         return jsonify({
             "code": "200",
             "len": len(product_list),
             "message": "Fetch products successfully",
+            "nextCursor": next_cursor,
             "data": product_list
         }), 200
     except Exception as e:
@@ -122,7 +226,8 @@ def get_products():
 
 # Obtener listado de imagenes
 @main.route('/api/v1/banner_images', methods=['GET'])
-@limiter.limit("5 per minute")  
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("banner_images")
 def get_banner_images_route():
     try:
         banner_images_list = get_banner_images_from_mongo(mongo)
@@ -136,7 +241,8 @@ def get_banner_images_route():
         return ErrorHandler.internal_server_error(f"Error fetching images r: {str(e)}")
 
 @main.route('/api/v1/categories', methods=['GET'])
-@limiter.limit("5 per minute")  
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("categories")
 def get_categories():
     try:
         categories = get_categories_from_mongo(mongo)
@@ -149,23 +255,115 @@ def get_categories():
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error fetching products r: {str(e)}")
 
+# Endpoint de busqueda de productos (indice invertido en memoria)
+@main.route('/api/v1/products/search', methods=['GET'])
+@limiter.limit(tier_limit("search"))
+def search_products_route():
+    query = request.args.get("q", "").strip()
+    if not query:
+        return ErrorHandler.bad_request_error("Missing search query r")
+    limit = request.args.get("limit", current_app.config["PRODUCTS_PAGE_SIZE"], type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if not limit or limit < 1 or offset < 0:
+        return ErrorHandler.bad_request_error("Invalid pagination parameters r")
+    try:
+        total, product_list = search_products(mongo, query, min(limit, current_app.config["PRODUCTS_MAX_PAGE_SIZE"]), offset)
+        return jsonify({
+            "code": "200",
+            "len": len(product_list),
+            "total": total,
+            "message": "Search products successfully",
+            "data": product_list
+        }), 200
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error searching products r: {str(e)}")
+
+# Endpoint para obtener todos los productos de una categoria
+@main.route('/api/v1/products/<string:product_category>', methods=['GET'])
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("products")
+def get_products_by_category_route(product_category):
+    try:
+        product_list = get_products_by_category(mongo, product_category)
+        return jsonify({
+            "code": "200",
+            "len": len(product_list),
+            "message": "Fetch products successfully",
+            "data": product_list
+        }), 200
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error fetching products r: {str(e)}")
+
+# Endpoint para obtener todos los productos de una subCategoria
+@main.route('/api/v1/products/<string:product_category>/<string:product_subCategory>', methods=['GET'])
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("products")
+def get_products_by_subCategory_route(product_category, product_subCategory):
+    try:
+        product_list = get_products_by_subCategory(mongo, product_category, product_subCategory)
+        return jsonify({
+            "code": "200",
+            "len": len(product_list),
+            "message": "Fetch products successfully",
+            "data": product_list
+        }), 200
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error fetching products r: {str(e)}")
+
+# Endpoint con productos, banner y categorias en una sola respuesta precodificada
+@main.route('/api/v1/bootstrap', methods=['GET'])
+@limiter.limit(tier_limit("catalog"))
+@conditional_get_middleware("bootstrap")
+def get_bootstrap():
+    try:
+        body = bootstrap_snapshot.get(encode_bootstrap)
+        return Response(body, status=200, mimetype="application/json")
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error fetching bootstrap r: {str(e)}")
+
+# Endpoint con contadores de cache para scraping (solo admin)
+@main.route('/api/v1/metrics', methods=['GET'])
+@limiter.limit(tier_limit("admin"))
+@jwt_required_middleware(location=['headers'], role="admin")
+def get_metrics():
+    return jsonify({
+        "code": "200",
+        "message": "Fetch metrics successfully",
+        "data": {
+            "catalog_cache": catalog_cache.stats(),
+            "user_cache": user_cache.stats(),
+            "token_denylist": token_denylist.stats(),
+            "rate_limiter": getattr(limiter.limiter, "stats", dict)(),
+            "idempotency": idempotency_store.stats(),
+            "bootstrap_snapshot_builds": bootstrap_snapshot.builds
+        }
+    }), 200
+
 # Endpoint para registrar usuarios
 @main.route('/api/v1/register', methods=['POST'])
-@limiter.limit("3 per 2 minute")  
+@limiter.limit(tier_limit("auth"))
 def register():
     return handle_register()
 
 # Endpoint para login
 @main.route('/api/v1/login', methods=['POST'])
-@limiter.limit("3 per 2 minute") 
+@limiter.limit(tier_limit("auth"))
 def login():
     return handle_login()
 
 @main.route("/api/v1/logout", methods=["POST"])
-@limiter.limit("3 per 2 minute") 
+@limiter.limit(tier_limit("auth"))
 # @jwt_required_middleware()
 def logout():
     try:
+        # Revocar el refresh token de la cookie y, si viene, el access token del header
+        tokens = [request.cookies.get("refresh_token_cookie")]
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            tokens.append(authorization[len("Bearer "):])
+        for token in filter(None, tokens):
+            revoke_token(token)
+
         response = make_response(
                 jsonify({
                     "code": "200",
@@ -187,12 +385,16 @@ def logout():
 
 # Endpoint para generar nuevo token de acceso
 @main.route("/api/v1/refresh", methods=["POST"])
-@limiter.limit("2 per 5 minute")  
+@limiter.limit(tier_limit("refresh"))
 @jwt_required_middleware(refresh=True, location=['cookies'])
 def refresh():
     try:
         identity = get_jwt_identity()
-        new_access_token = create_access_token(identity=identity, fresh=True)
+        # Los claims se recalculan con el user actual para reflejar cambios de rol
+        user = get_cached_user_by_id(mongo, identity)
+        if not user:
+            return ErrorHandler.not_found_error("User not found r")
+        new_access_token = create_access_token(identity=identity, fresh=True, additional_claims=build_user_claims(user))
         return jsonify({
                     "code": "200",
                     "message": "Refresh successful",
@@ -203,7 +405,7 @@ def refresh():
        
 # Actualizar un data de un user
 @main.route('/api/v1/user/data', methods=['PUT'])
-@limiter.limit("3 per 5 minute")  
+@limiter.limit(tier_limit("account"))
 @jwt_required_middleware(location=['headers'])
 def update_user_data_route():
     try:
@@ -214,7 +416,7 @@ def update_user_data_route():
         if get_jwt_identity() != str(update_data.get("_id")):
             return ErrorHandler.conflict_error("Identities do not match r")
         
-        hashed_info = generate_password_hash(update_data.get('info')) 
+        hashed_info = password_hasher.hash(update_data.get('info'))
 
         update_data.pop('info', None)
         update_data["password"] = hashed_info
@@ -225,12 +427,15 @@ def update_user_data_route():
             return ErrorHandler.not_found_error("User not found r") 
 
         return jsonify({"code": "201", "message": "User data updated successfully", "data": "ok"}), 201
+    except HashingPoolSaturated:
+        return ErrorHandler.service_unavailable_error("Too many concurrent password updates, please retry r")
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error during updating user data r: {str(e)}")    
 
 # Endpoint para procesar el checkout
 @main.route('/api/v1/checkout', methods=['POST'])
-@limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("checkout"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="user")
 def checkout():
     try:
@@ -239,26 +444,36 @@ def checkout():
         if not checkout_data:
             return ErrorHandler.bad_request_error("Missing mandatory fields r")
 
-        if not get_user_by_id(mongo, get_jwt_identity()):
+        identity = get_jwt_identity()
+        if not get_cached_user_by_id(mongo, identity):
             return ErrorHandler.not_found_error("User not found r")
 
-        new_checkout = create_checkout(mongo, checkout_data)
+        new_checkout = create_checkout(mongo, identity, checkout_data)
 
         return jsonify({"code": "201", "message": "Order created successfully", "data": new_checkout}), 201
+    except CheckoutPricingError as e:
+        return ErrorHandler.bad_request_error(f"{str(e)} r")
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error procesing order r: {str(e)}")
 
 @main.route('/api/v1/orders/user', methods=['GET'])
-@limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("orders"))
 @jwt_required_middleware(location=['headers'])
 def get_orders_by_user_route():
     try:
         identity = get_jwt_identity()
-        orders = get_orders_by_user(mongo, identity)
+        if request.args.get("stream") == "true":
+            return stream_envelope(iter_orders_by_user_id(mongo, identity), "Fetching orders successfully")
+        try:
+            limit, after = get_page_args("ORDERS_PAGE_SIZE", "ORDERS_MAX_PAGE_SIZE", decode_cursor)
+        except ValueError as e:
+            return ErrorHandler.bad_request_error(f"{str(e)} r")
+        orders, next_cursor = get_orders_page_by_user(mongo, identity, limit, after)
         return jsonify({    
             "code": "200",
             "len": len(orders),
             "message": "Fetching orders successfully",
+            "nextCursor": next_cursor,
             "data": orders
         }), 200
     except Exception as e:
@@ -270,28 +485,51 @@ def get_orders_by_user_route():
 
 # Endpoint para registrar usuarios
 @main.route('/api/v1/register/admin', methods=['POST'])
-@limiter.limit("3 per 2 minute")
+@limiter.limit(tier_limit("auth"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")  
 def register_admin():
     return handle_register(role_required="admin")
 
 # Endpoint para login admin
 @main.route('/api/v1/login/admin', methods=['POST'])
-@limiter.limit("3 per 2 minute") 
+@limiter.limit(tier_limit("auth"))
 def login_admin():
     return handle_login(role_required="admin")
 
 # Endpoint para obtener lista de usuarios
 @main.route('/api/v1/admin/users', methods=['GET'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
 @jwt_required_middleware(location=['headers'], role="admin")
 def get_users_route():
     try:
-        user_list = get_users(mongo)
+        # Listado completo sin paginar para clientes antiguos
+        if request.args.get("all") == "true":
+            if request.args.get("stream") == "true":
+                return stream_envelope(iter_users(mongo), "Fetch users successfully")
+            user_list = get_users(mongo)
+            return jsonify({
+                "code": "200",
+                "len": len(user_list),
+                "message": "Fetch users successfully",
+                "data": user_list
+            }), 200
+
+        try:
+            limit, after = get_page_args("USERS_PAGE_SIZE", "USERS_MAX_PAGE_SIZE")
+        except ValueError as e:
+            return ErrorHandler.bad_request_error(f"{str(e)} r")
+
+        role = request.args.get("role")
+        if role and role not in ("user", "admin"):
+            return ErrorHandler.bad_request_error("role must be user or admin r")
+
+        user_list, next_cursor = get_users_page(mongo, limit, after, role=role, email_prefix=request.args.get("email"))
         return jsonify({
             "code": "200",
             "len": len(user_list),
             "message": "Fetch users successfully",
+            "nextCursor": next_cursor,
             "data": user_list
         }), 200
 
@@ -299,7 +537,8 @@ def get_users_route():
         return ErrorHandler.internal_server_error(f"Error fetching users r: {str(e)}")
 
 @main.route('/api/v1/admin/user/edit', methods=['PUT'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def update_user_route():
     request_json = request.get_json()
@@ -318,7 +557,8 @@ def update_user_route():
 
 # Endpoint para borrar un usuario
 @main.route('/api/v1/admin/user/delete/<string:id>', methods=['DELETE'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def delete_user_route(id):
     if not id:
@@ -337,7 +577,7 @@ def delete_user_route(id):
 
 # Endpoint para buscar un usuario    
 @main.route('/api/v1/admin/user/<string:user_email>', methods=['GET'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
 @jwt_required_middleware(location=['headers'], role="admin")
 def get_user_by_email_route(user_email):
     if not user_email:
@@ -356,7 +596,7 @@ def get_user_by_email_route(user_email):
 
 # Obtener un producto por su SKU
 @main.route('/api/v1/admin/product/<string:sku>', methods=['GET'])
-# @limiter.limit("2 per minute")
+@limiter.limit(tier_limit("admin"))
 @jwt_required_middleware(location=['headers'], role="admin") 
 def get_product_by_sku_route(sku):
     if not sku:
@@ -371,17 +611,20 @@ def get_product_by_sku_route(sku):
 
 # Actualizar un producto
 @main.route('/api/v1/admin/product/edit', methods=['PUT'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def update_product_route():
     request_json = request.get_json()
     update_data = request_json["product"]
     if not update_data:
         return ErrorHandler.bad_request_error("Error missing body r")
-    if not update_data.get("sku"):
-        return ErrorHandler.bad_request_error("Error missing product sku r")
+    if not update_data.get("_id"):
+        return ErrorHandler.bad_request_error("Error missing product _id r")
     try:
         updated_product = update_product(mongo, update_data)
+        if isinstance(updated_product, Response):
+            return updated_product
         if not updated_product:
             return ErrorHandler.not_found_error("Error product not found r")
         return jsonify({"code": "200", "message": "Product modified successfully", "data": updated_product}), 200
@@ -390,7 +633,8 @@ def update_product_route():
     
 # Endpoint para borrar un producto
 @main.route('/api/v1/admin/product/delete/<string:id>', methods=['DELETE'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def delete_product_route(id):
     if not id:
@@ -409,19 +653,27 @@ def delete_product_route(id):
 
 # Obtener pedidos por user_id
 @main.route('/api/v1/admin/orders/user/<string:user_id>', methods=['POST'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
 @jwt_required_middleware(location=['headers'], role="admin")
 def get_orders_by_user_id_route(user_id):
     if not user_id:
         return ErrorHandler.bad_request_error("Error missing user id r")
     try:
-        orders = get_orders_by_user_id(mongo, user_id)
-        if not orders:
+        # En streaming no se conoce de antemano si hay pedidos: se responde 200 con data vacia
+        if request.args.get("stream") == "true":
+            return stream_envelope(iter_orders_by_user_id(mongo, user_id), "Fetching orders successfully")
+        try:
+            limit, after = get_page_args("ORDERS_PAGE_SIZE", "ORDERS_MAX_PAGE_SIZE", decode_cursor)
+        except ValueError as e:
+            return ErrorHandler.bad_request_error(f"{str(e)} r")
+        orders, next_cursor = get_orders_page_by_user(mongo, user_id, limit, after)
+        if not orders and not after:
             return ErrorHandler.not_found_error("Orders not found r")
         return jsonify({    
             "code": "200",
             "len": len(orders),
             "message": "Fetching orders successfully",
+            "nextCursor": next_cursor,
             "data": orders
         }), 200
     except Exception as e:
@@ -429,7 +681,8 @@ def get_orders_by_user_id_route(user_id):
 
 # Actualizar estado del pedido
 @main.route('/api/v1/admin/order/status/edit', methods=['PUT'])
-# @limiter.limit("2 per 5 minute")  
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def update_order_status_route():
     update_data = request.get_json()
@@ -443,9 +696,60 @@ def update_order_status_route():
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error during updating order status r: {str(e)}")  
     
+# Actualizar el status de varios pedidos en una sola escritura
+@main.route('/api/v1/admin/order/status/bulk_edit', methods=['PUT'])
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
+@jwt_required_middleware(location=['headers'], role="admin")
+def update_orders_status_bulk_route():
+    request_json = request.get_json(silent=True) or {}
+    updates = request_json.get("orders")
+    if not updates or not isinstance(updates, list):
+        return ErrorHandler.bad_request_error("Missing orders r")
+    if len(updates) > current_app.config["ORDERS_BULK_MAX_SIZE"]:
+        return ErrorHandler.bad_request_error(f"At most {current_app.config['ORDERS_BULK_MAX_SIZE']} orders per request r")
+    try:
+        results = update_orders_status_bulk(mongo, updates)
+        updated = sum(1 for result in results if result["result"] == "updated")
+        return jsonify({
+            "code": "200",
+            "len": len(results),
+            "updated": updated,
+            "message": "Orders status updated",
+            "data": results
+        }), 200
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error during updating orders status r: {str(e)}")
+
+# Exportar pedidos (NDJSON o CSV) en streaming, con rango de trxDate y cursor para retomar
+@main.route('/api/v1/admin/orders/export', methods=['GET'])
+@limiter.limit(tier_limit("admin"))
+@jwt_required_middleware(location=['headers'], role="admin")
+def export_orders_route():
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in ("ndjson", "csv"):
+        return ErrorHandler.bad_request_error("format must be ndjson or csv r")
+    try:
+        since = request.args.get("from")
+        until = request.args.get("to")
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        after = request.args.get("after")
+        after = decode_cursor(after) if after else None
+    except ValueError as e:
+        return ErrorHandler.bad_request_error(f"{str(e)} r")
+    try:
+        orders = iter_orders_export(mongo, since, until, after, current_app.config["ORDERS_EXPORT_BATCH_SIZE"])
+        if export_format == "csv":
+            return stream_csv(orders, ORDER_FIELDS + ("cursor",), filename="orders.csv")
+        return stream_ndjson(orders, filename="orders.ndjson")
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error exporting orders r: {str(e)}")
+
 # Crear un nuevo producto
 @main.route('/api/v1/admin/product/add', methods=['POST'])
-# @limiter.limit("2 per minute") 
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
 @jwt_required_middleware(location=['headers'], role="admin")
 def create_product_route():
     product_data = request.get_json()
@@ -462,8 +766,8 @@ def create_product_route():
     description = product_data.get('description')
     freeShiping = product_data.get('freeShiping')
     isActive = product_data.get('isActive')
-    sku = product_data.get('sku')
-    if not all([name, category, subCategory, normalPrice, dealPrice, discountPercentage, rating, imageResources, description, freeShiping, isActive, sku]):
+    # El sku lo asigna el servidor
+    if not all([name, category, subCategory, normalPrice, dealPrice, discountPercentage, rating, imageResources, description, freeShiping, isActive]):
         return ErrorHandler.bad_request_error("Missing required fields r")
     try:
         new_product = create_product(mongo, product_data)
@@ -471,42 +775,24 @@ def create_product_route():
     except Exception as e:
         return ErrorHandler.internal_server_error(f"Error creating product r: {str(e)}")
 
-# # Endpoint para obtener todos los productos de una categoria
-# @main.route('/products/<string:product_category>', methods=['GET'])
-# @limiter.limit("2 per minute") 
-# def get_products_by_category_route(product_category):
-#     try:
-#         # Delegar la consulta a MongoDB
-#         product_list = get_products_by_category(mongo, product_category)
-#         return jsonify({
-#             "code": "200",
-#             "len": len(product_list),
-#             "message": "Productos obtenidos exitosamente",
-#             "data": product_list
-#         }), 200
-
-#     except Exception as e:
-#         return jsonify({
-#             "code": "500",
-#             "message": f"Error al obtener productos: {str(e)} r"
-#         }), 500    
-
-# # Endpoint para obtener todos los productos de una subCategoria
-# @main.route('/products/<string:product_category>/<string:product_subCategory>', methods=['GET'])
-# @limiter.limit("2 per minute") 
-# def get_products_by_subCategory_route(product_category, product_subCategory):
-#     try:
-#         # Delegar la consulta a MongoDB
-#         product_list = get_products_by_subCategory(mongo, product_category, product_subCategory)
-#         return jsonify({
-#             "code": "200",
-#             "len": len(product_list),
-#             "message": "Productos obtenidos exitosamente",
-#             "data": product_list
-#         }), 200
-
-#     except Exception as e:
-#         return jsonify({
-#             "code": "500",
-#             "message": f"Error al obtener productos: {str(e)} r"
-#         }), 500        
+# Importar productos en lote (SKUs reservados en un solo bloque)
+@main.route('/api/v1/admin/product/import', methods=['POST'])
+@limiter.limit(tier_limit("admin"))
+@idempotent_middleware()
+@jwt_required_middleware(location=['headers'], role="admin")
+def import_products_route():
+    request_json = request.get_json(silent=True) or {}
+    products = request_json.get("products")
+    if not products or not isinstance(products, list):
+        return ErrorHandler.bad_request_error("Missing products r")
+    if len(products) > current_app.config["PRODUCTS_IMPORT_MAX_SIZE"]:
+        return ErrorHandler.bad_request_error(f"At most {current_app.config['PRODUCTS_IMPORT_MAX_SIZE']} products per request r")
+    invalid = [index for index, product in enumerate(products)
+               if not isinstance(product, dict) or validate_product_data(product) is not None]
+    if invalid:
+        return ErrorHandler.bad_request_error(f"Missing required fields in products {', '.join(map(str, invalid))} r")
+    try:
+        created = import_products(mongo, products)
+        return jsonify({"code": "201", "len": len(created), "message": "Products imported successfully", "data": created}), 201
+    except Exception as e:
+        return ErrorHandler.internal_server_error(f"Error importing products r: {str(e)}")
@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from threading import Lock
+
+## BUSQUEDA DE PRODUCTOS ##
+
+# Campos indexados y su peso en el ranking
+SEARCH_FIELDS = {"name": 3.0, "category": 2.0, "subCategory": 2.0, "description": 1.0}
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+# Normalizar (minusculas, sin tildes) y separar en tokens
+def tokenize(text):
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", str(text).lower())
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(normalized)
+
+
+class ProductSearchIndex:
+    """Indice invertido en memoria: token -> {product_id: peso}.
+
+    Una consulta solo recorre las listas de sus propios tokens, por lo que su
+    costo depende de la cantidad de coincidencias y no del tamaño del catalogo.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._postings = defaultdict(dict)
+        self._products = {}
+        self._tokens = {}
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._built_at = None
+        # Cambios incrementales recibidos mientras se reconstruye (se aplican al nuevo indice)
+        self._pending = None
+
+    def _weights(self, product):
+        weights = defaultdict(float)
+        for field, weight in SEARCH_FIELDS.items():
+            for token in tokenize(product.get(field)):
+                weights[token] += weight
+        return weights
+
+    def _remove(self, product_id):
+        for token in self._tokens.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._products.pop(product_id, None)
+
+    def _add(self, product):
+        product_id = product["_id"]
+        self._remove(product_id)
+        weights = self._weights(product)
+        for token, weight in weights.items():
+            self._postings[token][product_id] = weight
+        self._tokens[product_id] = tuple(weights)
+        self._products[product_id] = product
+
+    def _is_fresh(self):
+        return self._built_at is not None and time.monotonic() - self._built_at <= self.ttl
+
+    # Reconstruir el indice completo a partir de productos ya mapeados
+    # El indice nuevo se arma fuera del lock; las busquedas siguen usando el anterior hasta el cambio
+    def build(self, products):
+        with self._build_lock:
+            self._rebuild(products)
+
+    def _rebuild(self, products):
+        with self._lock:
+            self._pending = []
+        fresh = ProductSearchIndex(self.ttl)
+        try:
+            for product in products:
+                fresh._add(product)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for operation, value in self._pending:
+                if operation == "add":
+                    fresh._add(value)
+                else:
+                    fresh._remove(value)
+            self._postings, self._products, self._tokens = fresh._postings, fresh._products, fresh._tokens
+            self._pending = None
+            self._built_at = time.monotonic()
+
+    # Reconstruir si nunca se construyo o si el indice supera su TTL (otros workers pudieron escribir)
+    # Solo un thread reconstruye; los demas siguen buscando en el indice vigente
+    def ensure_fresh(self, loader):
+        if self._is_fresh():
+            return
+        # Sin indice previo hay que esperar al build en curso
+        if not self._build_lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            if not self._is_fresh():
+                self._rebuild(loader())
+        finally:
+            self._build_lock.release()
+
+    def add(self, product):
+        with self._lock:
+            self._add(product)
+            if self._pending is not None:
+                self._pending.append(("add", product))
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+            if self._pending is not None:
+                self._pending.append(("remove", product_id))
+
+    # Productos ordenados por tokens coincidentes y luego por peso acumulado
+    def search(self, query: str, limit: int, offset: int = 0):
+        tokens = set(tokenize(query))
+        with self._lock:
+            scores = defaultdict(lambda: [0, 0.0])
+            for token in tokens:
+                for product_id, weight in self._postings.get(token, {}).items():
+                    score = scores[product_id]
+                    score[0] += 1
+                    score[1] += weight
+            ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+            page = [self._products[product_id] for product_id, _ in ranked[offset:offset + limit]]
+        return len(ranked), page
+
+    def __len__(self):
+        return len(self._products)
+
+
+# Indice de productos activos del proceso
+product_search_index = ProductSearchIndex(ttl=int(os.getenv("SEARCH_INDEX_TTL", 300)))
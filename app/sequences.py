@@ -0,0 +1,59 @@
+import os
+from threading import Lock
+from flask_pymongo import PyMongo
+from pymongo import ReturnDocument
+
+## SECUENCIAS ##
+
+class SequenceAllocator:
+    """Valores consecutivos desde un documento contador en MongoDB.
+
+    Cada `$inc` atomico reserva un bloque de `block_size` valores que el proceso
+    entrega desde memoria; con block_size 1 cada valor cuesta una escritura y
+    no quedan huecos. `reserve` pide de una vez un rango para importaciones
+    masivas. Los valores son unicos entre workers, pero no necesariamente
+    crecientes entre ellos cuando block_size > 1.
+    """
+
+    collection = "counters"
+
+    def __init__(self, name: str, block_size: int = 1):
+        self.name = name
+        self.block_size = max(1, block_size)
+        self._next = 0
+        self._end = 0
+        self._lock = Lock()
+
+    # Rango [inicio, fin) de `count` valores nuevos
+    def reserve(self, mongo: PyMongo, count: int):
+        counter = mongo.db[self.collection].find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"value": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        end = counter["value"] + 1
+        return range(end - count, end)
+
+    def next(self, mongo: PyMongo):
+        with self._lock:
+            if self._next >= self._end:
+                block = self.reserve(mongo, self.block_size)
+                self._next, self._end = block.start, block.stop
+            value = self._next
+            self._next += 1
+            return value
+
+    # Llevar el contador al menos hasta `floor` (idempotente, seguro entre workers)
+    # Descarta el bloque local: sus valores pueden estar por debajo del nuevo piso
+    def seed(self, mongo: PyMongo, floor: int):
+        mongo.db[self.collection].update_one({"_id": self.name}, {"$max": {"value": floor}}, upsert=True)
+        with self._lock:
+            self._next = self._end = 0
+
+    def is_seeded(self, mongo: PyMongo):
+        return mongo.db[self.collection].find_one({"_id": self.name}, {"_id": 1}) is not None
+
+
+# SKUs de productos
+sku_sequence = SequenceAllocator("products.sku", block_size=int(os.getenv("SKU_SEQUENCE_BLOCK_SIZE", 1)))
@@ -1,4 +1,9 @@
 from handlers.services_error_handler import ErrorHandlerServices
+from bson.objectid import ObjectId
+from datetime import datetime
+import base64
+import json
+import os
 
 def serialize_mongo_document(document):
     if not document:
@@ -6,6 +11,48 @@ def serialize_mongo_document(document):
     document["_id"] = str(document["_id"]) if "_id" in document else None
     return document
 
+# Proyeccion de MongoDB para una lista de campos (excluye _id si no se pide)
+def projection(fields):
+    fields_projection = {field: 1 for field in fields}
+    if "_id" not in fields_projection:
+        fields_projection["_id"] = 0
+    return fields_projection
+
+_SCALAR_CONVERTERS = {ObjectId: str, datetime: str}
+
+# Convertir ObjectId/datetime (tambien anidados) a valores serializables
+def to_json_value(value):
+    value_type = type(value)
+    converter = _SCALAR_CONVERTERS.get(value_type)
+    if converter:
+        return converter(value)
+    if value_type is list:
+        return [to_json_value(item) for item in value]
+    if value_type is dict:
+        return {key: to_json_value(item) for key, item in value.items()}
+    return value
+
+# Mapear un documento a los campos declarados en una sola pasada
+# Los campos en `raw_fields` ya son JSON (se guardaron tal como llegaron) y no se recorren
+def map_document(document: dict, fields, raw_fields=()):
+    return {
+        field: document.get(field) if field in raw_fields else to_json_value(document.get(field))
+        for field in fields
+    }
+
+# Cursor opaco de paginacion (fecha, _id) para ordenes que no son solo por _id
+def encode_cursor(date: datetime, _id):
+    raw = json.dumps([date.isoformat(), str(_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, _id = json.loads(raw)
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
 
 def validate_product_data(product_data: dict):
     required_fields = [
@@ -19,8 +66,7 @@ def validate_product_data(product_data: dict):
         "imageResources",
         "description",
         "freeShiping",
-        "isActive",
-        "sku"
+        "isActive"
     ]
     missing_fields = [field for field in required_fields if field not in product_data]
     
@@ -93,7 +139,6 @@ def validate_and_filter_update_product(update_data: dict):
         "description",
         "freeShiping",
         "isActive",
-        "sku",
         "uploadDateTime"
     ]
 
@@ -119,4 +164,89 @@ def validate_and_filter_update_user(update_data: dict):
     missing_fields = [field for field in required_fields if field not in update_data]
     
     if missing_fields:
-        return ErrorHandlerServices.missing_requeried_fields_error(f"{'s:, '.join(missing_fields)}")
\ No newline at end of file
+        return ErrorHandlerServices.missing_requeried_fields_error(f"{'s:, '.join(missing_fields)}")
+
+## PRECIOS DEL CHECKOUT ##
+
+class CheckoutPricingError(ValueError):
+    """El carrito no se puede valorizar (SKU inexistente/inactivo, cantidad invalida,
+    cupon o montos del cliente distintos a los del servidor)."""
+
+
+# Costo de envio fijo del servidor (se omite si todos los productos tienen envio gratis)
+CHECKOUT_SHIPPING_COST = float(os.getenv("CHECKOUT_SHIPPING_COST", 0))
+
+
+# Campos del producto que se copian a cada linea del carrito
+CART_PRODUCT_FIELDS = ("sku", "name", "normalPrice", "dealPrice", "imageResources")
+
+def _as_number(value, name: str):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise CheckoutPricingError(f"{name} must be a number")
+    if number < 0:
+        raise CheckoutPricingError(f"{name} must not be negative")
+    return number
+
+# SKUs y cantidades del carrito (las lineas repetidas de un mismo SKU se suman)
+def cart_quantities(cart_products):
+    if not isinstance(cart_products, list) or not cart_products:
+        raise CheckoutPricingError("cartProducts must be a non-empty list")
+    quantities = {}
+    for item in cart_products:
+        if not isinstance(item, dict) or not item.get("sku"):
+            raise CheckoutPricingError("every cart product needs a sku")
+        quantity = item.get("quantity", 1)
+        if type(quantity) is not int or quantity < 1:
+            raise CheckoutPricingError(f"invalid quantity for sku {item['sku']}")
+        sku = str(item["sku"])
+        quantities[sku] = quantities.get(sku, 0) + quantity
+    return quantities
+
+# Montos del cliente que deben coincidir con los del servidor (el cliente no los elige)
+CHECKOUT_CLIENT_AMOUNTS = ("shippingCost", "totalAmount")
+
+# Recalcular lineas y totales del pedido con los precios del catalogo (products: sku -> producto)
+# No hay cupones en el servidor: un pedido con descuento se rechaza. Si el cliente envia envio o total
+# y no coinciden con los calculados se rechaza, en vez de cobrar un monto que la UI no mostro
+def price_checkout(checkout_data: dict, quantities: dict, products: dict, shipping_cost: float = CHECKOUT_SHIPPING_COST):
+    for field in ("couponFactor", "couponAmount"):
+        if checkout_data.get(field) and _as_number(checkout_data[field], field) != 0:
+            raise CheckoutPricingError("coupons are not supported")
+
+    missing = [sku for sku in quantities if sku not in products]
+    if missing:
+        raise CheckoutPricingError(f"products not available: {', '.join(missing)}")
+
+    cart = []
+    sub_total = 0.0
+    for sku, quantity in quantities.items():
+        product = products[sku]
+        line = {field: product.get(field) for field in CART_PRODUCT_FIELDS}
+        line["quantity"] = quantity
+        line["lineTotal"] = round(_as_number(product.get("dealPrice"), "dealPrice") * quantity, 2)
+        sub_total += line["lineTotal"]
+        cart.append(line)
+
+    # Sin costo de envio si todos los productos del carrito lo tienen gratis
+    if all(str(products[sku].get("freeShiping")).lower() == "true" for sku in quantities):
+        shipping_cost = 0.0
+
+    sub_total = round(sub_total, 2)
+    amounts = {"shippingCost": round(shipping_cost, 2), "totalAmount": round(sub_total + shipping_cost, 2)}
+    for field in CHECKOUT_CLIENT_AMOUNTS:
+        if checkout_data.get(field) is not None and round(_as_number(checkout_data[field], field), 2) != amounts[field]:
+            raise CheckoutPricingError(f"{field} does not match the current prices ({amounts[field]})")
+
+    total = amounts["totalAmount"]
+    checkout_data.update({
+        "cartProducts": cart,
+        "subTotalAmount": sub_total,
+        "shippingCost": amounts["shippingCost"],
+        "totalAmount": total,
+        "couponFactor": 0,
+        "couponAmount": 0,
+        "totalWithDiscountAmount": total
+    })
+    return checkout_data
@@ -0,0 +1,72 @@
+import csv
+import io
+from flask import Response, json, stream_with_context
+
+# Tamaño aproximado (en caracteres) de cada chunk enviado al cliente
+STREAM_CHUNK_SIZE = 64 * 1024
+
+## RESPUESTAS EN STREAMING ##
+
+# Codificar documentos uno a uno dentro del sobre {code, message, data, len}
+def stream_envelope(documents, message: str, code: str = "200"):
+    def generate():
+        buffer = [f'{{"code": "{code}", "message": {json.dumps(message)}, "data": [']
+        size = 0
+        count = 0
+        for document in documents:
+            encoded = json.dumps(document)
+            buffer.append(f",{encoded}" if count else encoded)
+            size += len(encoded)
+            count += 1
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        # len se conoce solo al terminar el cursor, por eso va al final del sobre
+        buffer.append(f'], "len": {count}}}')
+        yield "".join(buffer)
+
+    return Response(stream_with_context(generate()), status=int(code), mimetype="application/json")
+
+# Un documento JSON por linea (NDJSON)
+def stream_ndjson(documents, filename: str = None):
+    def generate():
+        buffer = []
+        size = 0
+        for document in documents:
+            encoded = json.dumps(document)
+            buffer.append(encoded)
+            buffer.append("\n")
+            size += len(encoded) + 1
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield "".join(buffer)
+
+    return _attachment(Response(stream_with_context(generate()), mimetype="application/x-ndjson"), filename)
+
+# CSV con las columnas indicadas; los valores anidados (listas, dicts) se escriben como JSON
+def stream_csv(documents, fields, filename: str = None):
+    def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(fields)
+        for document in documents:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, (list, dict)) else value
+                for value in (document.get(field) for field in fields)
+            ])
+            if output.tell() >= STREAM_CHUNK_SIZE:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
+
+    return _attachment(Response(stream_with_context(generate()), mimetype="text/csv"), filename)
+
+def _attachment(response: Response, filename: str = None):
+    if filename:
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
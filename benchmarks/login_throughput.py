@@ -0,0 +1,82 @@
+"""Throughput de login con hashing inline vs pool acotado (app.auth.PasswordHasher).
+
+Simula N requests de login concurrentes (verificacion de clave) mientras otros
+threads atienden requests "baratos" del catalogo, y reporta logins/s, logins
+rechazados con 503 y la latencia p50/p95 de los requests del catalogo.
+
+Uso: python benchmarks/login_throughput.py --concurrency 16 --logins 64
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.auth import PasswordHasher, HashingPoolSaturated, PASSWORD_HASH_METHOD
+
+CATALOG_PAYLOAD = [{"sku": str(i), "name": f"product {i}", "dealPrice": i * 100} for i in range(200)]
+
+
+def catalog_worker(stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        json.dumps(CATALOG_PAYLOAD)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+
+
+def run(mode, hasher, hashed, concurrency, logins, catalog_threads):
+    stop = threading.Event()
+    latencies = []
+    catalog = [threading.Thread(target=catalog_worker, args=(stop, latencies)) for _ in range(catalog_threads)]
+    for thread in catalog:
+        thread.start()
+
+    def login(_):
+        try:
+            if mode == "inline":
+                return check_password_hash(hashed, "secret")
+            return hasher.verify(hashed, "secret")
+        except HashingPoolSaturated:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as requests:
+        results = list(requests.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for thread in catalog:
+        thread.join()
+
+    accepted = sum(1 for result in results if result)
+    quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else [0] * 19
+    print(f"{mode:>6}: {accepted / elapsed:7.2f} logins/s  rejected(503)={results.count(None):3d}  "
+          f"catalog p50={statistics.median(latencies) * 1000:6.2f}ms p95={quantiles[18] * 1000:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-limit", type=int, default=8)
+    parser.add_argument("--catalog-threads", type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = generate_password_hash("secret", PASSWORD_HASH_METHOD)
+    hasher = PasswordHasher(PASSWORD_HASH_METHOD, args.workers, args.queue_limit, timeout=60)
+    print(f"method={PASSWORD_HASH_METHOD} concurrency={args.concurrency} logins={args.logins} "
+          f"pool={args.workers}+{args.queue_limit} cpus={os.cpu_count()}")
+    run("inline", hasher, hashed, args.concurrency, args.logins, args.catalog_threads)
+    run("pool", hasher, hashed, args.concurrency, args.logins, args.catalog_threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import gzip
+import os
+from flask import request
+from app.cache import catalog_bodies
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin el paquete solo se negocia gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+
+# Elegir la codificacion aceptada por el cliente (br tiene prioridad en empate)
+def negotiate_encoding(accept_encodings):
+    candidates = ["br", "gzip"] if brotli else ["gzip"]
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(data: bytes, encoding: str):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+# Compresion de respuestas JSON; las del catalogo se comprimen una vez por ETag
+def init_compression(app):
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.mimetype != "application/json"
+                or response.direct_passthrough or response.is_streamed
+                or "Content-Encoding" in response.headers):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding(request.accept_encodings)
+        if not encoding:
+            return response
+
+        etag, _ = response.get_etag()
+        hit, bodies = catalog_bodies.get(etag) if etag else (False, None)
+        if hit and encoding in bodies:
+            data = bodies[encoding]
+        else:
+            raw = response.get_data()
+            if len(raw) < COMPRESSION_MIN_SIZE:
+                return response
+            data = compress(raw, encoding)
+            if hit:
+                bodies[encoding] = data
+
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
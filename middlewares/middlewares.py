@@ -1,9 +1,15 @@
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, jwt_required
+from flask import Response, request, make_response
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt, jwt_required
 from functools import wraps
+import hashlib
 from handlers.error_handler import ErrorHandler
 from jwt.exceptions import ExpiredSignatureError
-from app.crud import get_user_by_id
+from flask_jwt_extended.exceptions import RevokedTokenError
+from app.crud import get_cached_user_by_id
 from app import mongo
+from app.cache import catalog_cache, catalog_bodies, body_etag
+from app.auth import JWT_ROLE_CLAIMS, user_token_versions
+from app.idempotency import idempotency_store, IDEMPOTENCY_KEY_MAX_LENGTH, DONE
 
 def jwt_required_middleware(role=None, refresh=False, location=None):
     def wrapper(fn):
@@ -21,11 +27,19 @@ def jwt_required_middleware(role=None, refresh=False, location=None):
                 identity = get_jwt_identity()
                 if not identity:
                     return ErrorHandler.unauthorized_error("Invalid token m")
-                
-                if not get_user_by_id(mongo, identity):
+
+                # Autorizacion solo con claims (sin MongoDB) para tokens que los incluyen
+                claims = get_jwt()
+                if JWT_ROLE_CLAIMS and "role" in claims:
+                    if not user_token_versions.is_valid(identity, claims.get("ver")):
+                        return ErrorHandler.unauthorized_error("Token has been revoked m")
+                    if role and claims["role"] != role:
+                        return ErrorHandler.forbidden_error("Access denied requires different role m")
+                    return fn(*args, **kwargs)
+
+                user = get_cached_user_by_id(mongo, identity)
+                if not user:
                     return ErrorHandler.not_found_error("User not found m")
-                
-                user = get_user_by_id(mongo, identity)
 
                 if role and user.get("role") != role:
                     return ErrorHandler.forbidden_error("Access denied requires different role m")
@@ -33,7 +47,101 @@ def jwt_required_middleware(role=None, refresh=False, location=None):
                 return fn(*args, **kwargs)
             except ExpiredSignatureError:
                 return ErrorHandler.expired_signature_error("Token has expired m")  # Retorna 401
+            except RevokedTokenError:
+                return ErrorHandler.unauthorized_error("Token has been revoked m")
             except Exception as e:
                 return ErrorHandler.internal_server_error(f"Error during verification m: {str(e)}")
         return decorated_function
     return wrapper
+
+def conditional_response(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, no-cache"
+    return response
+
+# GET condicional (ETag / If-None-Match) para rutas del catalogo publico
+# El tag es el hash del cuerpo; con el cache caliente se responde sin consultar MongoDB
+def conditional_get_middleware(name):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_function(*args, **kwargs):
+            # La version y generacion se leen antes de cargar los datos: una escritura concurrente descarta el tag
+            key = ("etag", name, request.full_path)
+            version, generation = catalog_cache.version, catalog_cache.generation()
+            hit, etag = catalog_cache.get(key)
+            bodies = None
+            if hit:
+                # Comparacion debil: las variantes comprimidas se sirven con ETag debil
+                if request.if_none_match.contains_weak(etag):
+                    return conditional_response(make_response("", 304), etag)
+                hit, bodies = catalog_bodies.get(etag)
+            if bodies is not None:
+                response = Response(bodies["identity"], status=200, mimetype="application/json")
+            else:
+                response = make_response(fn(*args, **kwargs))
+                # Sin cuerpo en memoria (streaming) no hay hash para el tag
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = body_etag(name, body)
+                if catalog_cache.generation() == generation:
+                    catalog_bodies.set(etag, {"identity": body})
+                    catalog_cache.set(key, etag, version)
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response("", 304)
+            return conditional_response(response, etag)
+        return decorated_function
+    return wrapper
+
+# Idempotency-Key: un reintento con la misma llave reenvia la respuesta guardada sin ejecutar la ruta
+# Va antes de jwt_required_middleware para que el reintento no consulte al user
+def idempotent_middleware():
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_function(*args, **kwargs):
+            idempotency_key = request.headers.get("Idempotency-Key")
+            if not idempotency_key:
+                return fn(*args, **kwargs)
+            if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return ErrorHandler.bad_request_error("Idempotency-Key is too long m")
+
+            # La llave es por user: sin token valido la ruta responde el error de autenticacion
+            try:
+                verify_jwt_in_request(locations=["headers"])
+                identity = get_jwt_identity()
+            except Exception:
+                return fn(*args, **kwargs)
+
+            key = f"{identity}:{request.method}:{request.path}:{idempotency_key}"
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            record = idempotency_store.begin(mongo, key, fingerprint)
+            if record is not None:
+                if record["fingerprint"] != fingerprint:
+                    return ErrorHandler.conflict_error("Idempotency-Key was used with a different request m")
+                if record["state"] != DONE:
+                    # Duplicado concurrente: se espera la respuesta del request original
+                    record = idempotency_store.wait_for(mongo, key)
+                    if record is None or record["state"] != DONE:
+                        # El original fallo o su lease vencio: se intenta tomar la llave
+                        record = idempotency_store.begin(mongo, key, fingerprint)
+                        if record is not None and record["state"] != DONE:
+                            return ErrorHandler.conflict_error("A request with this Idempotency-Key is in progress m")
+            if record is not None:
+                idempotency_store.replays += 1
+                response = Response(record["body"], status=record["status"], mimetype=record["mimetype"])
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+
+            try:
+                response = make_response(fn(*args, **kwargs))
+            except Exception:
+                idempotency_store.release(mongo, key)
+                raise
+            # Los errores del servidor no se guardan: el cliente puede reintentar
+            if response.status_code >= 500 or response.is_streamed:
+                idempotency_store.release(mongo, key)
+            else:
+                idempotency_store.complete(mongo, key, response.status_code, response.get_data(), response.mimetype)
+            return response
+        return decorated_function
+    return wrapper
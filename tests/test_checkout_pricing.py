@@ -0,0 +1,78 @@
+import sys
+import os
+
+# Asegúrate de que la raiz del proyecto esté en el path de Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from app.services import cart_quantities, price_checkout, CheckoutPricingError
+
+# Clase de pruebas unitarias para la valorizacion del checkout
+class TestCheckoutPricing(unittest.TestCase):
+
+    def setUp(self):
+        self.products = {
+            "1": {"sku": "1", "name": "A", "normalPrice": 12, "dealPrice": 10.5, "freeShiping": "true"},
+            "2": {"sku": "2", "name": "B", "normalPrice": 4, "dealPrice": 0.1, "freeShiping": "false"},
+        }
+
+    def test_cart_quantities_sums_duplicate_skus(self):
+        quantities = cart_quantities([{"sku": "1", "quantity": 2}, {"sku": "2"}, {"sku": 1}])
+        self.assertEqual(quantities, {"1": 3, "2": 1})
+
+    def test_cart_quantities_rejects_invalid_carts(self):
+        for cart in (None, [], [{"quantity": 1}], [{"sku": "1", "quantity": 0}], [{"sku": "1", "quantity": 1.5}]):
+            with self.assertRaises(CheckoutPricingError):
+                cart_quantities(cart)
+
+    def test_missing_or_inactive_sku_is_rejected(self):
+        # Los productos inactivos no vuelven de la consulta, igual que los inexistentes
+        with self.assertRaises(CheckoutPricingError):
+            price_checkout({}, {"1": 1, "3": 1}, self.products)
+
+    def test_totals_use_catalog_prices(self):
+        checkout = {
+            "cartProducts": [{"sku": "1", "dealPrice": 0.01}],
+            "couponFactor": 0,
+            "couponAmount": 0,
+            "shippingCost": 5,
+            "totalAmount": 26.1,
+        }
+        price_checkout(checkout, {"1": 2, "2": 1}, self.products, shipping_cost=5)
+        self.assertEqual(checkout["subTotalAmount"], 21.1)
+        self.assertEqual(checkout["shippingCost"], 5)
+        self.assertEqual(checkout["totalAmount"], 26.1)
+        self.assertEqual(checkout["couponFactor"], 0)
+        self.assertEqual(checkout["couponAmount"], 0)
+        self.assertEqual(checkout["totalWithDiscountAmount"], 26.1)
+        self.assertEqual([line["lineTotal"] for line in checkout["cartProducts"]], [21.0, 0.1])
+
+    def test_coupons_are_rejected(self):
+        for coupon in ({"couponFactor": 0.1}, {"couponAmount": 2}, {"couponAmount": "2"}):
+            with self.assertRaises(CheckoutPricingError):
+                price_checkout(dict(coupon), {"1": 1}, self.products, shipping_cost=5)
+
+    def test_client_amounts_must_match(self):
+        for amounts in ({"totalAmount": 20}, {"shippingCost": 0}, {"totalAmount": "abc"}):
+            with self.assertRaises(CheckoutPricingError):
+                price_checkout(dict(amounts), {"2": 1}, self.products, shipping_cost=5)
+        checkout = {"shippingCost": 5, "totalAmount": "5.1"}
+        price_checkout(checkout, {"2": 1}, self.products, shipping_cost=5)
+        self.assertEqual(checkout["totalAmount"], 5.1)
+
+    def test_free_shipping_only_when_every_product_has_it(self):
+        checkout = {}
+        price_checkout(checkout, {"1": 1}, self.products, shipping_cost=5)
+        self.assertEqual(checkout["shippingCost"], 0)
+        self.assertEqual(checkout["totalAmount"], 10.5)
+
+    def test_amounts_are_rounded_to_cents(self):
+        checkout = {}
+        price_checkout(checkout, {"2": 3}, self.products, shipping_cost=0)
+        self.assertEqual(checkout["cartProducts"][0]["lineTotal"], 0.3)
+        self.assertEqual(checkout["subTotalAmount"], 0.3)
+        self.assertEqual(checkout["totalAmount"], 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import os
+
+# Asegúrate de que la raiz del proyecto esté en el path de Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import unittest
+from app.denylist import BloomFilter, MemoryDenylistBackend, TokenDenylist
+
+# Clase de pruebas unitarias para el filtro de Bloom
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"jti-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        # Margen sobre el 1% esperado para que la prueba no dependa del hash
+        self.assertLess(false_positives, 300)
+
+
+# Clase de pruebas unitarias para la denylist con el backend en memoria
+class TestTokenDenylist(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryDenylistBackend()
+        self.denylist = TokenDenylist(self.backend, capacity=100, error_rate=0.01, sync_interval=3600)
+
+    def test_revoked_token_is_rejected(self):
+        self.denylist.revoke("jti-1", time.time() + 60)
+        self.assertTrue(self.denylist.is_revoked("jti-1"))
+        self.assertFalse(self.denylist.is_revoked("jti-2"))
+
+    def test_unknown_tokens_skip_the_backend(self):
+        self.denylist.revoke("jti-1", time.time() + 60)
+        calls = []
+        self.backend.contains = lambda jti: calls.append(jti) or False
+        results = [self.denylist.is_revoked(f"valid-{i}") for i in range(50)]
+        self.assertEqual(results, [False] * 50)
+        # Solo los falsos positivos del filtro llegan al backend
+        self.assertEqual(len(calls), self.denylist.stats()["bloom_hits"])
+        self.assertEqual(self.denylist.stats()["checks"], 50)
+
+    def test_expired_tokens_are_not_stored(self):
+        self.denylist.revoke("jti-1", time.time() - 1)
+        self.assertEqual(self.backend.active(), [])
+        self.assertFalse(self.denylist.is_revoked("jti-1"))
+
+    def test_sync_drops_expired_and_loads_backend_entries(self):
+        self.backend.add("expired", time.time() + 0.05)
+        # Revocacion hecha por otro worker: solo esta en el backend
+        self.backend.add("other-worker", time.time() + 60)
+        time.sleep(0.1)
+        self.denylist.sync_interval = 0
+        self.assertTrue(self.denylist.is_revoked("other-worker"))
+        self.assertNotIn("expired", self.denylist._bloom)
+
+    def test_backend_failure_keeps_previous_filter(self):
+        self.denylist.revoke("jti-1", time.time() + 60)
+        self.denylist.sync_interval = 0
+
+        def unavailable():
+            raise ConnectionError("backend down")
+
+        self.backend.active = unavailable
+        self.assertTrue(self.denylist.is_revoked("jti-1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+import sys
+import os
+
+# Asegúrate de que la raiz del proyecto esté en el path de Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-with-at-least-32-bytes")
+
+import copy
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from pymongo.errors import DuplicateKeyError
+from app.idempotency import IdempotencyStore, PENDING, DONE
+import middlewares.middlewares as middlewares
+
+
+# Coleccion en memoria con las operaciones que usa IdempotencyStore
+class FakeCollection:
+
+    def __init__(self):
+        self.documents = {}
+
+    def _matches(self, document, filters):
+        for field, condition in filters.items():
+            if field == "$or":
+                if not any(self._matches(document, option) for option in condition):
+                    return False
+            elif isinstance(condition, dict):
+                if "$exists" in condition and (field in document) != condition["$exists"]:
+                    return False
+                if "$lt" in condition and not (field in document and document[field] < condition["$lt"]):
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+
+    def _find(self, filters):
+        document = self.documents.get(filters["_id"])
+        return document if document is not None and self._matches(document, filters) else None
+
+    def insert_one(self, document):
+        if document["_id"] in self.documents:
+            raise DuplicateKeyError("E11000 duplicate key")
+        self.documents[document["_id"]] = copy.deepcopy(document)
+
+    def find_one(self, filters):
+        document = self._find(filters)
+        return copy.deepcopy(document) if document is not None else None
+
+    def find_one_and_update(self, filters, update, **kwargs):
+        document = self._find(filters)
+        if document is None:
+            return None
+        document.update(update["$set"])
+        return copy.deepcopy(document)
+
+    def update_one(self, filters, update):
+        document = self._find(filters)
+        if document is not None:
+            document.update(update["$set"])
+
+    def delete_one(self, filters):
+        if self._find(filters) is not None:
+            del self.documents[filters["_id"]]
+
+
+class FakeMongo:
+
+    def __init__(self):
+        self.db = {"idempotency_keys": FakeCollection()}
+
+
+# Clase de pruebas unitarias para el almacen de Idempotency-Key
+class TestIdempotencyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo = FakeMongo()
+        self.collection = self.mongo.db["idempotency_keys"]
+        self.store = IdempotencyStore(wait=0.3, poll_interval=0.01, max_poll_interval=0.05, lease=30)
+
+    def test_begin_acquires_a_new_key(self):
+        self.assertIsNone(self.store.begin(self.mongo, "k", "f"))
+        self.assertEqual(self.collection.documents["k"]["state"], PENDING)
+
+    def test_begin_returns_the_record_of_a_held_key(self):
+        self.store.begin(self.mongo, "k", "f")
+        record = self.store.begin(self.mongo, "k", "f")
+        self.assertEqual(record["state"], PENDING)
+        self.assertEqual(self.store.takeovers, 0)
+
+    def test_expired_lease_is_taken_over(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.collection.documents["k"]["lockedUntil"] = datetime.utcnow() - timedelta(seconds=1)
+        self.assertIsNone(self.store.begin(self.mongo, "k", "f"))
+        self.assertEqual(self.store.takeovers, 1)
+        self.assertGreater(self.collection.documents["k"]["lockedUntil"], datetime.utcnow())
+
+    def test_expired_lease_is_not_taken_with_another_fingerprint(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.collection.documents["k"]["lockedUntil"] = datetime.utcnow() - timedelta(seconds=1)
+        record = self.store.begin(self.mongo, "k", "other")
+        self.assertEqual(record["fingerprint"], "f")
+        self.assertEqual(self.store.takeovers, 0)
+
+    def test_completed_key_is_not_taken_over(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.store.complete(self.mongo, "k", 201, b"{}", "application/json")
+        self.collection.documents["k"]["lockedUntil"] = datetime.utcnow() - timedelta(seconds=1)
+        self.assertEqual(self.store.begin(self.mongo, "k", "f")["state"], DONE)
+
+    def test_release_frees_the_key(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.store.release(self.mongo, "k")
+        self.assertIsNone(self.store.begin(self.mongo, "k", "f"))
+
+    def test_wait_for_returns_when_lease_expires(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.collection.documents["k"]["lockedUntil"] = datetime.utcnow() - timedelta(seconds=1)
+        self.assertEqual(self.store.wait_for(self.mongo, "k")["state"], PENDING)
+
+    def test_wait_for_gives_up_on_a_live_lease(self):
+        self.store.begin(self.mongo, "k", "f")
+        self.assertIsNone(self.store.wait_for(self.mongo, "k"))
+
+
+# Clase de pruebas unitarias para idempotent_middleware
+class TestIdempotentMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.mongo = FakeMongo()
+        self.store = IdempotencyStore(wait=0.2, poll_interval=0.01, max_poll_interval=0.05, lease=30)
+        patches = [patch.object(middlewares, "mongo", self.mongo), patch.object(middlewares, "idempotency_store", self.store)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.app = Flask(__name__)
+        self.app.config["JWT_SECRET_KEY"] = os.environ["JWT_SECRET_KEY"]
+        JWTManager(self.app)
+        self.calls = 0
+
+        @self.app.route("/orders", methods=["POST"])
+        @middlewares.idempotent_middleware()
+        def create_order():
+            self.calls += 1
+            return jsonify({"order": self.calls}), 201
+
+        with self.app.app_context():
+            token = create_access_token(identity="user-1")
+        self.client = self.app.test_client()
+        self.headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "key-1"}
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.client.post("/orders", json={"sku": "1"}, headers=self.headers)
+        retry = self.client.post("/orders", json={"sku": "1"}, headers=self.headers)
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(retry.headers.get("Idempotent-Replayed"), "true")
+        self.assertEqual(self.calls, 1)
+
+    def test_same_key_with_another_body_is_a_conflict(self):
+        self.client.post("/orders", json={"sku": "1"}, headers=self.headers)
+        response = self.client.post("/orders", json={"sku": "2"}, headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 1)
+
+    def test_request_in_progress_is_a_conflict(self):
+        key = "user-1:POST:/orders:key-1"
+        self.store.begin(self.mongo, key, middlewares.hashlib.sha256(b'{"sku":"1"}').hexdigest())
+        response = self.client.post("/orders", data='{"sku":"1"}', content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    def test_crashed_request_is_retried_after_its_lease(self):
+        key = "user-1:POST:/orders:key-1"
+        self.store.begin(self.mongo, key, middlewares.hashlib.sha256(b'{"sku":"1"}').hexdigest())
+        self.mongo.db["idempotency_keys"].documents[key]["lockedUntil"] = datetime.utcnow() - timedelta(seconds=1)
+        response = self.client.post("/orders", data='{"sku":"1"}', content_type="application/json", headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import os
+
+# Asegúrate de que la raiz del proyecto esté en el path de Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from app.ratelimit import TwoTierRateLimiter
+
+# Clase de pruebas unitarias para la estrategia de rate limit en dos niveles
+class TestTwoTierRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = storage_from_string("memory://")
+        self.limiter = TwoTierRateLimiter(self.storage)
+        # Sin sincronizacion por tiempo: solo por lote o cercania al limite
+        self.limiter.sync_interval = 3600
+        self.limiter.max_batch = 10
+        self.limiter.headroom = 0.2
+
+    def remote_count(self, item, identifier="client"):
+        return self.storage.get(item.key_for(identifier))
+
+    def test_admission_stays_within_limit(self):
+        item = RateLimitItemPerMinute(30)
+        admitted = sum(self.limiter.hit(item, "client") for _ in range(100))
+        self.assertEqual(admitted, 30)
+
+    def test_limits_are_per_identifier(self):
+        item = RateLimitItemPerMinute(5)
+        admitted = [sum(self.limiter.hit(item, identifier) for _ in range(10)) for identifier in ("a", "b")]
+        self.assertEqual(admitted, [5, 5])
+
+    def test_pending_hits_are_flushed_on_sync(self):
+        item = RateLimitItemPerMinute(100)
+        for _ in range(5):
+            self.limiter.hit(item, "client")
+        # Solo el primer hit llego al storage; los otros 4 quedaron pendientes en memoria
+        self.assertEqual(self.remote_count(item), 1)
+        self.assertEqual(self.limiter.local_hits, 4)
+
+        self.limiter.sync_interval = 0
+        self.limiter.hit(item, "client")
+        self.assertEqual(self.remote_count(item), 6)
+
+    def test_batch_bound(self):
+        self.limiter.max_batch = 3
+        item = RateLimitItemPerMinute(1000)
+        for hits in range(1, 51):
+            self.limiter.hit(item, "client")
+            self.assertGreaterEqual(self.remote_count(item), hits - 3)
+
+    def test_headroom_bound(self):
+        self.limiter.headroom = 0.5
+        item = RateLimitItemPerMinute(10)
+        for hits in range(1, 11):
+            self.limiter.hit(item, "client")
+            # Por sobre amount * (1 - headroom) cada hit se sincroniza con el storage
+            if hits > 5:
+                self.assertEqual(self.remote_count(item), hits)
+        self.assertLessEqual(self.limiter.local_hits, 4)
+
+    def test_test_and_window_stats_include_pending_hits(self):
+        item = RateLimitItemPerMinute(5)
+        for _ in range(4):
+            self.limiter.hit(item, "client")
+        self.assertLess(self.remote_count(item), 4)
+        self.assertEqual(self.limiter.get_window_stats(item, "client").remaining, 1)
+        self.assertTrue(self.limiter.test(item, "client"))
+        self.limiter.hit(item, "client")
+        self.assertEqual(self.limiter.get_window_stats(item, "client").remaining, 0)
+        self.assertFalse(self.limiter.test(item, "client"))
+
+    def test_clear_drops_local_budget(self):
+        item = RateLimitItemPerMinute(5)
+        for _ in range(5):
+            self.limiter.hit(item, "client")
+        self.assertFalse(self.limiter.hit(item, "client"))
+        self.limiter.clear(item, "client")
+        self.assertTrue(self.limiter.hit(item, "client"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Asegúrate de que la raiz del proyecto esté en el path de Python
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from app.search import ProductSearchIndex, tokenize
+
+# Clase de pruebas unitarias para el indice de busqueda de productos
+class TestProductSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ProductSearchIndex(ttl=300)
+        self.products = [
+            {"_id": "a", "name": "Notebook Gamer", "category": "Computacion", "subCategory": "Notebooks"},
+            {"_id": "b", "name": "Mouse inalambrico", "category": "Computacion", "subCategory": "Accesorios"},
+        ]
+        self.index.build(self.products)
+
+    def ids(self, query):
+        return [product["_id"] for product in self.index.search(query, limit=10)[1]]
+
+    def test_tokenize_normalizes_accents_and_case(self):
+        self.assertEqual(tokenize("Computación GAMER"), ["computacion", "gamer"])
+
+    def test_search_ranks_by_matched_tokens(self):
+        self.assertEqual(self.ids("notebook computacion"), ["a", "b"])
+        self.assertEqual(self.ids("teclado"), [])
+
+    def test_rebuild_replays_pending_changes(self):
+        def loader():
+            yield self.products[0]
+            # Escrituras de otros requests mientras se reconstruye
+            self.index.add({"_id": "c", "name": "Teclado mecanico", "category": "Computacion"})
+            self.index.remove("b")
+            # Las busquedas siguen usando el indice anterior (mas los cambios incrementales)
+            self.assertEqual(self.ids("teclado"), ["c"])
+            yield self.products[1]
+
+        self.index.build(loader())
+        self.assertEqual(self.ids("computacion"), ["a", "c"])
+        self.assertEqual(len(self.index), 2)
+        self.assertIsNone(self.index._pending)
+
+    def test_failed_rebuild_keeps_previous_index(self):
+        def loader():
+            yield self.products[0]
+            raise RuntimeError("mongo down")
+
+        with self.assertRaises(RuntimeError):
+            self.index.build(loader())
+        self.assertEqual(self.ids("mouse"), ["b"])
+        self.index.add({"_id": "c", "name": "Teclado"})
+        self.assertIsNone(self.index._pending)
+
+    def test_ensure_fresh_does_not_wait_for_a_running_rebuild(self):
+        self.index.ttl = 0
+        calls = []
+
+        def loader():
+            yield self.products[0]
+            # Con un rebuild en curso, ensure_fresh responde con el indice vigente
+            self.index.ensure_fresh(lambda: calls.append("loader") or [])
+            yield self.products[1]
+
+        self.index.build(loader())
+        self.assertEqual(calls, [])
+
+    def test_ensure_fresh_builds_once_within_ttl(self):
+        calls = []
+        index = ProductSearchIndex(ttl=300)
+        index.ensure_fresh(lambda: calls.append("loader") or self.products)
+        index.ensure_fresh(lambda: calls.append("loader") or self.products)
+        self.assertEqual(calls, ["loader"])
+        self.assertEqual(len(index), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()